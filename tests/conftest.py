@@ -0,0 +1,25 @@
+import glob
+import importlib.util
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = glob.glob(os.path.join(ROOT, "蓝奏云分卷压缩*.py"))[0]
+
+
+def load_app():
+    """脚本名不是合法的模块名，按路径加载；界面和网盘相关的库缺少时也能导入"""
+    if "lanzou_tools" in sys.modules:
+        return sys.modules["lanzou_tools"]
+    spec = importlib.util.spec_from_file_location("lanzou_tools", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["lanzou_tools"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture(scope="session")
+def app():
+    return load_app()
@@ -0,0 +1,40 @@
+"""--benchmark 在没有 tkinter、requests、lanzou-api 的服务器上也能运行"""
+import json
+import subprocess
+import sys
+
+from conftest import SCRIPT
+
+BLOCKED_RUNNER = '''
+import importlib.abc, runpy, sys
+
+class Blocked(importlib.abc.MetaPathFinder):
+    def find_spec(self, name, path, target=None):
+        if name.split('.')[0] in ('tkinter', '_tkinter', 'requests', 'lanzou'):
+            raise ImportError(f"blocked: {name}")
+
+sys.meta_path.insert(0, Blocked())
+script = sys.argv[1]
+sys.argv = [script] + sys.argv[2:]
+runpy.run_path(script, run_name='__main__')
+'''
+
+
+def test_benchmark_runs_without_gui_and_network_packages(tmp_path):
+    output = tmp_path / "bench.json"
+    result = subprocess.run(
+        [sys.executable, "-c", BLOCKED_RUNNER, SCRIPT, "--benchmark",
+         "--sizes", "3MB", "--kinds", "random", "--part-size", "1MB",
+         "--workdir", str(tmp_path), "--output", str(output)],
+        capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr
+    report = json.loads(output.read_text(encoding="utf-8"))
+    assert [item["case"] for item in report["results"]] == ["split", "merge", "media_split"]
+    assert all(item["parts"] for item in report["results"])
+
+
+def test_gui_reports_missing_packages(tmp_path):
+    result = subprocess.run([sys.executable, "-c", BLOCKED_RUNNER, SCRIPT],
+                            capture_output=True, text=True, timeout=60)
+    assert result.returncode != 0
+    assert "tkinter" in result.stderr and "requests" in result.stderr
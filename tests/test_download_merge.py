@@ -0,0 +1,91 @@
+"""边下边合并：LanZouCloud 的文件列表（File 命名元组）直接交给 LanzouAPI 合并"""
+import os
+from collections import namedtuple
+
+import pytest
+
+File = namedtuple('File', ['name', 'id', 'time', 'size', 'type', 'downs', 'has_pwd', 'has_des'])
+
+
+class FakeResponse:
+    def __init__(self, text="", payload=None, content=b""):
+        self.text = text
+        self.payload = payload
+        self.content = content
+        self.status_code = 200
+
+    def json(self):
+        return self.payload
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            yield self.content[start:start + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class FakeSession:
+    """模拟蓝奏云的下载页、ajaxm.php 和下载链接，文件按 id 存放"""
+    def __init__(self, contents):
+        self.contents = contents
+
+    def get(self, url, stream=False, headers=None):
+        if 'mydisk.php' in url:
+            return FakeResponse(text=f"var sign = '{url.rsplit('=', 1)[1]}';")
+        return FakeResponse(content=self.contents[url.rsplit('/', 1)[1]])
+
+    def post(self, url, data=None, headers=None):
+        return FakeResponse(payload={'zt': 1, 'dom': 'https://down', 'url': data['sign']})
+
+
+def cloud_listing(parts):
+    return [File(name, str(index), '今天', f"{len(content) / 1024:.1f} K", 'zip', 0, False, False)
+            for index, (name, content) in enumerate(parts, 1)]
+
+
+def test_merge_from_namedtuple_listing(app, tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 999)
+    sizes = [1024 * 1024 + 7, 1024 * 1024, len(data) - 2 * 1024 * 1024 - 7]
+    parts, offset = [], 0
+    for index, size in enumerate(sizes, 1):
+        parts.append((f"movie.mp4.part({index}).zip", data[offset:offset + size]))
+        offset += size
+    # 同一文件夹里的其他分卷组和普通文件不参与合并
+    parts.append(("other.bin.part(1).zip", b"x" * 100))
+    files = cloud_listing(parts)
+    api = app.LanzouAPI.from_session(FakeSession({f.id: content
+                                                  for f, (_, content) in zip(files, parts)}))
+    logs, progress = [], []
+    output = tmp_path / "movie.mp4"
+    assert api.download_and_merge(files, "movie.mp4", ".zip", str(output),
+                                  log=lambda message, error=False: logs.append(message),
+                                  progress=lambda done, total: progress.append((done, total)))
+    assert output.read_bytes() == data
+    assert len(logs) == 3
+    assert progress and all(done <= total for done, total in progress)
+
+
+def test_stop_removes_partial_output(app, tmp_path):
+    parts = [(f"movie.mp4.part({index}).zip", os.urandom(1024 * 1024)) for index in (1, 2)]
+    files = cloud_listing(parts)
+    api = app.LanzouAPI.from_session(FakeSession({f.id: content
+                                                  for f, (_, content) in zip(files, parts)}))
+    output = tmp_path / "movie.mp4"
+    assert not api.download_and_merge(files, "movie.mp4", ".zip", str(output),
+                                      should_stop=lambda: True)
+    assert not output.exists()
+
+
+def test_missing_group_is_rejected(app, tmp_path):
+    files = cloud_listing([("other.bin.part(1).zip", b"x")])
+    api = app.LanzouAPI.from_session(FakeSession({"1": b"x"}))
+    with pytest.raises(app.IntegrityError):
+        api.download_and_merge(files, "movie.mp4", ".zip", str(tmp_path / "movie.mp4"))
+    assert not (tmp_path / "movie.mp4").exists()
@@ -0,0 +1,108 @@
+"""中断后继续：原地合并和分卷都能从停下的位置接着做，缺失或截断的分卷在写入前被拒绝"""
+import hashlib
+import os
+
+import pytest
+
+PART = 1024 * 1024
+STEP = 256 * 1024
+
+
+def stop_after(calls):
+    """前 calls 次检查返回 False，之后一直返回 True"""
+    count = [0]
+
+    def should_stop():
+        count[0] += 1
+        return count[0] > calls
+    return should_stop
+
+
+def split(app, tmp_path, manifest=True, **kwargs):
+    data = os.urandom(8 * PART + 4321)
+    source = tmp_path / "data.bin"
+    source.write_bytes(data)
+    out = tmp_path / "parts"
+    out.mkdir(exist_ok=True)
+    app.SplitEngine(str(source), str(out), 2 * PART, STEP, ".bin", manifest=manifest, **kwargs).run()
+    return data, out
+
+
+def parts(app, out):
+    return app.PartIndex.related_parts(str(out / "data.bin.part(1).bin"))
+
+
+def test_split_resumes_after_stop(app, tmp_path):
+    data = os.urandom(5 * PART + 4321)
+    source = tmp_path / "data.bin"
+    source.write_bytes(data)
+    out = tmp_path / "parts"
+    out.mkdir()
+    plan = app.VolumePlan(PART, 0, len(data))
+    first = app.SplitEngine(str(source), str(out), PART, 0, ".zip", buffer_size=64 * 1024,
+                            manifest=True, should_stop=stop_after(2)).run()
+    assert 0 < first['parts'] < plan.part_count
+    assert (out / "data.bin.journal").exists()
+    written = {name: os.stat(out / name).st_mtime_ns for name in os.listdir(out)
+               if name.startswith("data.bin.part")}
+
+    logs = []
+    second = app.SplitEngine(str(source), str(out), PART, 0, ".zip", buffer_size=64 * 1024,
+                             manifest=True, log=lambda message, error=False: logs.append(message)).run()
+    assert second['parts'] == plan.part_count
+    assert not (out / "data.bin.journal").exists()
+    names = [f"data.bin.part({index}).zip" for index in range(1, plan.part_count + 1)]
+    assert b''.join((out / name).read_bytes() for name in names) == data
+    # 中断前完整写入的分卷不会重写
+    resumed = [name for name in written if (out / name).stat().st_mtime_ns == written[name]]
+    assert resumed and any("继续" in message for message in logs)
+
+
+@pytest.mark.parametrize("manifest", [True, False])
+def test_in_place_merge_resumes_after_stop(app, tmp_path, manifest):
+    data, out = split(app, tmp_path, manifest=manifest)
+    output = tmp_path / "data.bin.merged"
+    progress_calls = [0]
+
+    def progress(done, total):
+        progress_calls[0] += 1
+
+    first = app.MergeEngine(parts(app, out), str(output), in_place=True, progress=progress,
+                            should_stop=lambda: progress_calls[0] > 2).run()
+    assert not first['completed']
+    assert (out / "data.bin.inplace.journal").exists()
+    # 已追加的分卷已经删除，剩下的分卷和 part(1) 仍在
+    remaining = sorted(name for name in os.listdir(out) if ".part(" in name)
+    assert "data.bin.part(1).bin" in remaining and "data.bin.part(2).bin" not in remaining
+
+    # 再次合并时即使没有选择原地合并，也按日志继续原地合并
+    second = app.MergeEngine(parts(app, out), str(output)).run()
+    assert second['completed']
+    assert hashlib.sha256(output.read_bytes()).hexdigest() == hashlib.sha256(data).hexdigest()
+    assert not any(".part(" in name or name.endswith(".journal") for name in os.listdir(out))
+
+
+@pytest.mark.parametrize("in_place", [False, True])
+def test_missing_part_is_rejected(app, tmp_path, in_place):
+    _, out = split(app, tmp_path, manifest=False)
+    os.remove(out / "data.bin.part(3).bin")
+    before = sorted(os.listdir(out))
+    with pytest.raises(app.IntegrityError, match=r"part\(3\)"):
+        app.MergeEngine(parts(app, out), str(tmp_path / "merged.bin"), in_place=in_place).run()
+    assert sorted(os.listdir(out)) == before
+    assert not (tmp_path / "merged.bin").exists()
+
+
+@pytest.mark.parametrize("manifest", [True, False])
+@pytest.mark.parametrize("index", [1, 2, 3])
+def test_truncated_part_is_rejected(app, tmp_path, manifest, index):
+    _, out = split(app, tmp_path, manifest=manifest)
+    victim = out / f"data.bin.part({index}).bin"
+    victim.write_bytes(victim.read_bytes()[:-1000])
+    before = {name: (out / name).stat().st_size for name in os.listdir(out)}
+    for in_place in (False, True):
+        with pytest.raises(app.IntegrityError, match=rf"part\({index}\)"):
+            app.MergeEngine(parts(app, out), str(tmp_path / "merged.bin"), in_place=in_place).run()
+        # 原地合并也在追加前检查，分卷保持原样
+        assert {name: (out / name).stat().st_size for name in os.listdir(out)} == before
+        assert not (tmp_path / "merged.bin").exists()
@@ -0,0 +1,118 @@
+"""分卷直传：上传的每个分卷必须正好是 VolumePlan 给出的源文件范围"""
+import os
+import threading
+from types import SimpleNamespace
+
+
+class FakeResponse:
+    def __init__(self, file_id):
+        self.file_id = file_id
+
+    def json(self):
+        return {'zt': 1, 'text': [{'id': self.file_id}]}
+
+
+class FakeSession:
+    """按小块读取请求体（和 requests 发送流式请求体的方式一样），解析出上传的文件内容"""
+    def __init__(self):
+        self.uploads = []
+
+    def post(self, url, data=None, headers=None):
+        chunks = []
+        while True:
+            chunk = data.read(8191)
+            if not chunk:
+                break
+            chunks.append(chunk)
+        body = b''.join(chunks)
+        assert len(body) == len(data)
+        boundary = headers['Content-Type'].split('boundary=')[1].encode()
+        for section in body.split(b'--' + boundary):
+            head, _, content = section.partition(b'\r\n\r\n')
+            if b'name="upload_file"' in head:
+                name = head.split(b'filename="')[1].split(b'"')[0].decode('utf-8')
+                self.uploads.append((name, content[:-2]))
+        return FakeResponse(str(len(self.uploads)))
+
+
+def test_uploaded_parts_match_plan_offsets(app, tmp_path):
+    data = os.urandom(5 * 1024 * 1024 + 12345)
+    source = tmp_path / "video.mkv"
+    source.write_bytes(data)
+    engine = app.SplitEngine(str(source), str(tmp_path), initial_bytes=2 * 1024 * 1024,
+                             step_bytes=512 * 1024, suffix=".zip")
+
+    api = app.LanzouAPI.__new__(app.LanzouAPI)
+    api.session = FakeSession()
+    api.is_logged_in = True
+    file_ids = api.upload_virtual_parts(engine)
+
+    plan = app.VolumePlan(2 * 1024 * 1024, 512 * 1024, len(data))
+    assert file_ids == [str(index) for index in range(1, plan.part_count + 1)]
+    assert len(api.session.uploads) == plan.part_count
+    for (name, content), (index, offset, size) in zip(api.session.uploads, plan):
+        assert name == engine.part_name(index)
+        assert content == data[offset:offset + size]
+    assert b''.join(content for _, content in api.session.uploads) == data
+    # 直传不在本地生成分卷
+    assert sorted(os.listdir(tmp_path)) == ["video.mkv"]
+
+
+class FakeLanZouCloud:
+    """只保留界面用到的部分：登录状态和登录后的会话"""
+    def __init__(self):
+        self.is_logged_in = True
+        self._session = FakeSession()
+
+
+class FakeWindow:
+    def after(self, delay, callback):
+        callback()
+
+
+def open_upload_dialog(app, monkeypatch, source, part_mb=None):
+    """通过 MainApplication 的上传按钮上传 source，返回弹出的提示"""
+    done = threading.Event()
+    messages = []
+
+    def show(kind):
+        def record(title, message, **kwargs):
+            messages.append((kind, message))
+            done.set()
+        return record
+
+    monkeypatch.setattr(app, "filedialog", SimpleNamespace(askopenfilename=lambda **kw: str(source)))
+    monkeypatch.setattr(app, "simpledialog", SimpleNamespace(askfloat=lambda *a, **kw: part_mb))
+    monkeypatch.setattr(app, "messagebox", SimpleNamespace(showinfo=show("info"),
+                                                          showerror=show("error")))
+    monkeypatch.setattr(app.MainApplication, "UPLOAD_MAX_MB", 2)
+    main = app.MainApplication.__new__(app.MainApplication)
+    main.lanzou = FakeLanZouCloud()
+    main.window = FakeWindow()
+    main.show_upload_dialog()
+    assert done.wait(30)
+    return main.lanzou._session.uploads, messages
+
+
+def test_upload_dialog_sends_small_file_whole(app, monkeypatch, tmp_path):
+    data = os.urandom(300 * 1024)
+    source = tmp_path / "notes.pdf"
+    source.write_bytes(data)
+    uploads, messages = open_upload_dialog(app, monkeypatch, source)
+    assert messages == [("info", "文件上传成功！")]
+    assert uploads == [("notes.pdf", data)]
+
+
+def test_upload_dialog_splits_large_file_without_local_parts(app, monkeypatch, tmp_path):
+    data = os.urandom(5 * 1024 * 1024 + 777)
+    source = tmp_path / "video.mkv"
+    source.write_bytes(data)
+    uploads, messages = open_upload_dialog(app, monkeypatch, source, part_mb=1.5)
+
+    plan = app.VolumePlan(int(1.5 * 1024 * 1024), 0, len(data))
+    assert messages == [("info", f"已上传 {plan.part_count} 个分卷")]
+    assert [name for name, _ in uploads] == [f"video.mkv.part({index}).zip"
+                                             for index in range(1, plan.part_count + 1)]
+    for (_, content), (_, offset, size) in zip(uploads, plan):
+        assert content == data[offset:offset + size]
+    assert sorted(os.listdir(tmp_path)) == ["video.mkv"]
@@ -1,22 +1,62 @@
 # 第一部分：導入庫和數據類
-import tkinter as tk
-from tkinter import ttk, filedialog, messagebox, simpledialog
 import os
+import io
+import sys
+import errno
 from typing import Optional
 from dataclasses import dataclass
 import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from pathlib import Path
 import subprocess
 import math
 import re
-import requests
 import json
 import time
 from urllib.parse import quote
 import hashlib
+import argparse
+import tempfile
+import platform
+import shutil
+import tarfile
+import struct
+import bisect
+from array import array
+import zlib
+import lzma
+import bz2
+from collections import deque, OrderedDict
+import select
+import itertools
+import functools
+import ctypes
+import ctypes.util
 import random
 import string
-from lanzou.api import LanZouCloud
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# 界面和网盘相关的库只在启动界面时需要，缺少时 --benchmark 等无界面功能仍然可以运行
+try:
+    import tkinter as tk
+    from tkinter import ttk, filedialog, messagebox, simpledialog
+except ImportError:
+    tk = ttk = filedialog = messagebox = simpledialog = None
+
+try:
+    import requests
+except ImportError:
+    requests = None
+
+try:
+    from lanzou.api import LanZouCloud
+except ImportError:
+    LanZouCloud = None
 
 @dataclass
 class CompressionConfig:
@@ -24,6 +64,10 @@ class CompressionConfig:
     step_reduction: float
     size_unit: str
     custom_suffix: str
+    buffer_size: int = 4 * 1024 * 1024
+    workers: int = 1
+    codec: str = ""
+    manifest: bool = False
 
 @dataclass
 class SplitConfig:
@@ -31,9 +75,2236 @@ class SplitConfig:
     step_reduction: float
     size_unit: str
     file_type: str
+    buffer_size: int = 4 * 1024 * 1024
+    workers: int = 1
+    # 并行提取音视频分段时的 ffmpeg 进程数，与分卷引擎的 workers 无关
+    media_workers: int = 1
+    parallel_extract: bool = False
+    io_bound: bool = False
+
+@dataclass
+class AppSettings:
+    buffer_size: str = "4MB"
+
+# 全局设置，由 SettingsDialog 写入，各工具在开始处理时读取
+APP_SETTINGS = AppSettings()
+
+SIZE_UNITS = {"GB": 1024 * 1024 * 1024, "MB": 1024 * 1024, "KB": 1024}
+
+def parse_size(text: str) -> int:
+    """把 "4MB" 这样的文本转换为字节数"""
+    text = text.strip().upper()
+    for unit, factor in SIZE_UNITS.items():
+        if text.endswith(unit):
+            return int(float(text[:-len(unit)]) * factor)
+    return int(float(text))
+
+# 第一部分（续）：文件复制工具
+# 内核零拷贝可用性，遇到 ENOSYS 等“不支持”错误后关闭对应路径，避免反复尝试
+_ZERO_COPY = {
+    'copy_file_range': hasattr(os, 'copy_file_range'),
+    'sendfile': hasattr(os, 'sendfile') and sys.platform.startswith('linux'),
+}
+# 这些错误表示当前文件/文件系统组合不支持该路径，应降级而不是报错
+_FALLBACK_ERRNOS = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EBADF,
+                    errno.EPERM, errno.ETXTBSY, getattr(errno, 'EOPNOTSUPP', errno.EINVAL)}
+DEFAULT_COPY_BUFFER = 1024 * 1024
+
+
+def copy_range(src, dst, offset: int, size: int,
+               buffer: Optional[bytearray] = None, hashers: tuple = ()) -> int:
+    """把 src 中 [offset, offset+size) 的字节追加写入 dst 的当前位置
+
+    依次尝试 os.copy_file_range、os.sendfile，最后退回到固定大小的 readinto 循环，
+    数据始终不会整块进入 Python 内存。返回实际复制的字节数（源文件提前结束时会小于 size）。
+    传入 hashers 时数据必须经过用户态，直接走 readinto 循环并顺带更新各个哈希对象。
+    """
+    dst.flush()
+    dst_offset = dst.tell()
+    src_fd = src.fileno()
+    dst_fd = dst.fileno()
+    copied = 0
+
+    if _ZERO_COPY['copy_file_range'] and not hashers and copied < size:
+        try:
+            while copied < size:
+                n = os.copy_file_range(src_fd, dst_fd, size - copied,
+                                       offset + copied, dst_offset + copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+            if e.errno == errno.ENOSYS:
+                _ZERO_COPY['copy_file_range'] = False
+
+    if _ZERO_COPY['sendfile'] and not hashers and copied < size:
+        try:
+            os.lseek(dst_fd, dst_offset + copied, os.SEEK_SET)
+            while copied < size:
+                n = os.sendfile(dst_fd, src_fd, offset + copied, size - copied)
+                if n == 0:
+                    break
+                copied += n
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+            if e.errno == errno.ENOSYS:
+                _ZERO_COPY['sendfile'] = False
+
+    if copied < size:
+        if buffer is None:
+            buffer = bytearray(min(DEFAULT_COPY_BUFFER, size - copied))
+        view = memoryview(buffer)
+        src.seek(offset + copied)
+        dst.seek(dst_offset + copied)
+        while copied < size:
+            n = src.readinto(view[:min(len(view), size - copied)])
+            if not n:
+                break
+            dst.write(view[:n])
+            for hasher in hashers:
+                hasher.update(view[:n])
+            copied += n
+        dst.flush()
+
+    dst.seek(dst_offset + copied)
+    return copied
+
+
+def peak_memory_bytes() -> Optional[int]:
+    """返回当前进程的峰值内存占用（字节），平台不支持时返回 None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+    except ImportError:
+        pass
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD),
+                        ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = PROCESS_MEMORY_COUNTERS()
+        counters.cb = ctypes.sizeof(counters)
+        handle = ctypes.windll.kernel32.GetCurrentProcess()
+        if ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb):
+            return counters.PeakWorkingSetSize
+    return None
+
+
+class VolumePlan:
+    """分卷计划：初始大小按步长递减，最小 1MB
+
+    给定总大小时一次性算出所有分卷的起始偏移（紧凑的 array），之后可按序号取大小和范围，
+    或按字节偏移二分查找所在分卷。序号从 1 开始，与分卷文件名 part(N) 一致。
+    """
+    MIN_PART_SIZE = 1024 * 1024  # Minimum 1MB
+
+    def __init__(self, initial_bytes: int, step_bytes: int,
+                 total_size: Optional[int] = None,
+                 min_bytes: int = MIN_PART_SIZE) -> None:
+        self.initial_bytes = initial_bytes
+        self.step_bytes = step_bytes
+        self.min_bytes = min_bytes
+        self.total_size = total_size
+        self.offsets = array('Q', [0])
+        if total_size is not None:
+            offset = 0
+            index = 1
+            while offset < total_size:
+                offset = min(offset + self.nominal_size(index), total_size)
+                self.offsets.append(offset)
+                index += 1
+
+    @classmethod
+    def from_config(cls, config, total_size: Optional[int] = None) -> 'VolumePlan':
+        return cls(int(config.initial_size * SIZE_UNITS.get(config.size_unit, 1024)),
+                   int(config.step_reduction * 1024),
+                   total_size)
+
+    @classmethod
+    def from_offsets(cls, initial_bytes: int, step_bytes: int, offsets) -> 'VolumePlan':
+        """使用外部算好的分卷边界（例如按帧对齐后的偏移），第一个元素为 0"""
+        plan = cls(initial_bytes, step_bytes)
+        plan.offsets = array('Q', offsets)
+        plan.total_size = plan.offsets[-1]
+        return plan
+
+    def nominal_size(self, index: int) -> int:
+        """第 index 个分卷的计划大小（不考虑文件末尾）"""
+        return max(self.initial_bytes - (index - 1) * self.step_bytes, self.min_bytes)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    @property
+    def part_count(self) -> int:
+        return len(self)
+
+    def part_size(self, index: int) -> int:
+        return self.offsets[index] - self.offsets[index - 1]
+
+    def part_range(self, index: int) -> tuple:
+        """返回 (偏移, 大小)"""
+        return self.offsets[index - 1], self.part_size(index)
+
+    def part_at(self, offset: int) -> int:
+        """返回包含该字节偏移的分卷序号"""
+        if not 0 <= offset < self.offsets[-1]:
+            raise IndexError(f"偏移 {offset} 超出范围")
+        return bisect.bisect_right(self.offsets, offset)
+
+    def __iter__(self):
+        """依次产生 (序号, 偏移, 大小)"""
+        for index in range(1, len(self.offsets)):
+            yield index, self.offsets[index - 1], self.offsets[index] - self.offsets[index - 1]
+
+
+class PartReader(io.RawIOBase):
+    """源文件中一个分卷范围的只读、可寻址视图
+
+    不生成分卷文件，上传等代码可以直接读取它；首次读取时才打开源文件。
+    """
+    def __init__(self, path: str, offset: int, size: int, name: str = "") -> None:
+        super().__init__()
+        self.path = path
+        self.offset = offset
+        self.size = size
+        self.name = name or Path(path).name
+        self.position = 0
+        self.file = None
+
+    def __len__(self) -> int:
+        return self.size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self.position
+        elif whence == io.SEEK_END:
+            pos += self.size
+        if pos < 0:
+            raise ValueError("负的偏移")
+        self.position = pos
+        return pos
+
+    def readinto(self, b) -> int:
+        remaining = self.size - self.position
+        if remaining <= 0:
+            return 0
+        if self.file is None:
+            self.file = open(self.path, 'rb', buffering=0)
+        view = memoryview(b).cast('B')[:remaining]
+        self.file.seek(self.offset + self.position)
+        n = self.file.readinto(view) or 0
+        self.position += n
+        return n
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        super().close()
+
+
+class BlockCodecError(ValueError):
+    """压缩数据损坏或截断；各压缩库的异常类型不同，解压时统一转换为这个异常"""
+
+
+class BlockCodec:
+    """分块压缩格式
+
+    格式: 魔数 b'LZVB' + 版本(1字节) + 算法编号(1字节) + 块大小(uint32)，
+    之后每块为 原始长度(uint32) + 压缩长度(uint32) + 压缩数据，以两个 0 结束。
+    各块相互独立，因此可以在线程池中并行压缩和解压。
+    """
+    MAGIC = b'LZVB'
+    VERSION = 1
+    # 长度字段为 uint32，压缩后的块可能略大于原始块，块大小留出足够余量
+    MAX_BLOCK_SIZE = 2 * 1024 * 1024 * 1024
+    HEADER = struct.Struct('<4sBBI')
+    BLOCK = struct.Struct('<II')
+    CODECS = {
+        'zlib': (1, lambda data: zlib.compress(data, 6), zlib.decompress),
+        'lzma': (2, lzma.compress, lzma.decompress),
+        'bz2': (3, bz2.compress, bz2.decompress),
+    }
+    # 损坏的数据在各个库中抛出的异常（bz2 为 OSError/EOFError/ValueError）
+    DECOMPRESS_ERRORS = (zlib.error, lzma.LZMAError, OSError, EOFError, ValueError)
+    if zstandard is not None:
+        CODECS['zstd'] = (4,
+                          lambda data: zstandard.ZstdCompressor().compress(data),
+                          lambda data: zstandard.ZstdDecompressor().decompress(data))
+        DECOMPRESS_ERRORS += (zstandard.ZstdError,)
+
+    @classmethod
+    def by_id(cls, codec_id: int) -> tuple:
+        for name, (cid, compress, decompress) in cls.CODECS.items():
+            if cid == codec_id:
+                return name, compress, decompress
+        raise BlockCodecError(f"不支持的压缩算法编号: {codec_id}")
+
+    @classmethod
+    def decompressor(cls, codec_id: int):
+        """返回解压函数，库自身的异常转换为 BlockCodecError"""
+        name, _, decompress = cls.by_id(codec_id)
+        errors = cls.DECOMPRESS_ERRORS
+
+        def run(data: bytes) -> bytes:
+            try:
+                return decompress(data)
+            except errors as e:
+                raise BlockCodecError(f"{name} 数据块解压失败: {e}") from e
+        return run
+
+    @classmethod
+    def check_block_size(cls, block_size: int) -> None:
+        if not 0 < block_size <= cls.MAX_BLOCK_SIZE:
+            raise ValueError(f"压缩块大小必须在 0 到 {cls.MAX_BLOCK_SIZE // (1024 * 1024)}MB 之间，"
+                             f"请在设置中减小缓冲区大小")
+
+    @classmethod
+    def is_compressed(cls, path: str) -> bool:
+        """只根据魔数判断，没有清单时使用；有清单时以清单记录的 codec 为准"""
+        with open(path, 'rb') as f:
+            return f.read(len(cls.MAGIC)) == cls.MAGIC
+
+
+class BlockCompressor:
+    """把写入的数据按块压缩后写入 sink，压缩在线程池中并行进行，结果按顺序输出"""
+    def __init__(self, sink, codec: str, block_size: int, workers: int) -> None:
+        BlockCodec.check_block_size(block_size)
+        self.sink = sink
+        self.codec_id, self.compress, _ = BlockCodec.CODECS[codec]
+        self.block_size = block_size
+        self.max_pending = workers * 2
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.pending = deque()
+        self.block = bytearray()
+        self.raw_bytes = 0
+        self.sink.write(BlockCodec.HEADER.pack(BlockCodec.MAGIC, BlockCodec.VERSION,
+                                               self.codec_id, block_size))
+
+    def write(self, data) -> int:
+        view = memoryview(data).cast('B')
+        total = len(view)
+        while view:
+            n = min(self.block_size - len(self.block), len(view))
+            self.block += view[:n]
+            view = view[n:]
+            if len(self.block) == self.block_size:
+                self._submit()
+        return total
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        try:
+            if self.block:
+                self._submit()
+            while self.pending:
+                self._drain_one()
+            self.sink.write(BlockCodec.BLOCK.pack(0, 0))
+        finally:
+            self.abort()
+
+    def abort(self) -> None:
+        """丢弃未完成的块并释放线程池（停止或出错时调用）"""
+        self.pool.shutdown(cancel_futures=True)
+        self.pending.clear()
+
+    def _submit(self) -> None:
+        block = bytes(self.block)
+        self.block = bytearray()
+        self.pending.append((len(block), self.pool.submit(self.compress, block)))
+        # 限制在途块数量，内存占用约为 (2 * workers + 1) 个块
+        while len(self.pending) > self.max_pending:
+            self._drain_one()
+
+    def _drain_one(self) -> None:
+        raw_len, future = self.pending.popleft()
+        data = future.result()
+        self.sink.write(BlockCodec.BLOCK.pack(raw_len, len(data)))
+        self.sink.write(data)
+        self.raw_bytes += raw_len
+
+
+def decompress_stream(src, dst, workers: int = 0, should_stop=None,
+                      progress=None) -> int:
+    """从 src 流式读取 BlockCodec 格式的数据并解压写入 dst，返回解压后的字节数"""
+    should_stop = should_stop or (lambda: False)
+    progress = progress or (lambda: None)
+    header = src.read(BlockCodec.HEADER.size)
+    if len(header) != BlockCodec.HEADER.size:
+        raise BlockCodecError("不是有效的压缩分卷数据")
+    magic, version, codec_id, block_size = BlockCodec.HEADER.unpack(header)
+    if magic != BlockCodec.MAGIC or version != BlockCodec.VERSION:
+        raise BlockCodecError("不是有效的压缩分卷数据")
+    decompress = BlockCodec.decompressor(codec_id)
+
+    workers = workers or os.cpu_count() or 1
+    pending = deque()
+    written = 0
+
+    def drain_one() -> int:
+        raw_len, future = pending.popleft()
+        data = future.result()
+        if len(data) != raw_len:
+            raise BlockCodecError("压缩块长度校验失败，分卷数据可能已损坏")
+        dst.write(data)
+        progress()
+        return raw_len
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        try:
+            while not should_stop():
+                block_header = src.read(BlockCodec.BLOCK.size)
+                if len(block_header) != BlockCodec.BLOCK.size:
+                    raise BlockCodecError("压缩数据意外结束，可能缺少分卷")
+                raw_len, comp_len = BlockCodec.BLOCK.unpack(block_header)
+                if raw_len == 0 and comp_len == 0:
+                    break
+                data = src.read(comp_len)
+                if len(data) != comp_len:
+                    raise BlockCodecError("压缩数据意外结束，可能缺少分卷")
+                pending.append((raw_len, pool.submit(decompress, data)))
+                while len(pending) > workers * 2:
+                    written += drain_one()
+            while pending:
+                written += drain_one()
+        finally:
+            for _, future in pending:
+                future.cancel()
+    return written
+
+
+class VolumeReader(io.RawIOBase):
+    """把一组分卷当作一个只读、可随机访问的文件，不需要先合并
+
+    前缀和数组记录每个分卷在整体中的起始偏移，按偏移二分查找所在分卷，一次读取可以跨越多个分卷。
+    打开的分卷句柄数有上限，超过时关闭最久未用的句柄。可以直接交给 tarfile、zipfile 等
+    需要可寻址文件的代码；reader[start:end] 按偏移读取，不改变当前位置。
+    """
+    MAX_OPEN_FILES = 8
+
+    def __init__(self, paths: list, max_open_files: int = MAX_OPEN_FILES) -> None:
+        super().__init__()
+        self.paths = list(paths)
+        self.offsets = array('Q', [0])
+        for path in self.paths:
+            self.offsets.append(self.offsets[-1] + os.path.getsize(path))
+        self.total_size = self.offsets[-1]
+        self.position = 0
+        self.max_open_files = max(1, max_open_files)
+        self.handles = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self.total_size
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self.position
+
+    def seek(self, pos: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_CUR:
+            pos += self.position
+        elif whence == io.SEEK_END:
+            pos += self.total_size
+        if pos < 0:
+            raise ValueError("负的偏移")
+        self.position = pos
+        return pos
+
+    def part_at(self, offset: int) -> int:
+        """offset 所在分卷的下标（从 0 开始）"""
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def _handle(self, index: int):
+        handle = self.handles.get(index)
+        if handle is not None:
+            self.handles.move_to_end(index)
+            return handle
+        if len(self.handles) >= self.max_open_files:
+            _, oldest = self.handles.popitem(last=False)
+            oldest.close()
+        handle = open(self.paths[index], 'rb', buffering=0)
+        self.handles[index] = handle
+        return handle
+
+    def readinto_at(self, offset: int, b) -> int:
+        """从整体偏移 offset 处读满 b（到末尾为止），不改变当前位置，返回读取的字节数"""
+        view = memoryview(b).cast('B')
+        filled = 0
+        with self.lock:
+            while filled < len(view) and offset < self.total_size:
+                index = self.part_at(offset)
+                part_offset = offset - self.offsets[index]
+                wanted = min(len(view) - filled, self.offsets[index + 1] - offset)
+                handle = self._handle(index)
+                handle.seek(part_offset)
+                n = handle.readinto(view[filled:filled + wanted])
+                if not n:
+                    raise IOError(f"{Path(self.paths[index]).name} 在读取过程中变短")
+                filled += n
+                offset += n
+        return filled
+
+    def read_at(self, offset: int, size: int) -> bytes:
+        buffer = bytearray(max(0, min(size, self.total_size - offset)))
+        n = self.readinto_at(offset, buffer)
+        return bytes(buffer[:n])
+
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            start, stop, step = key.indices(self.total_size)
+            if step != 1:
+                raise ValueError("只支持连续切片")
+            return self.read_at(start, stop - start)
+        if key < 0:
+            key += self.total_size
+        if not 0 <= key < self.total_size:
+            raise IndexError("偏移超出范围")
+        return self.read_at(key, 1)[0]
+
+    def readinto(self, b) -> int:
+        n = self.readinto_at(self.position, b)
+        self.position += n
+        return n
+
+    def close(self) -> None:
+        with self.lock:
+            for handle in self.handles.values():
+                handle.close()
+            self.handles.clear()
+        super().close()
+
+
+class ConcatenatedReader(VolumeReader):
+    """按顺序读取多个分卷的数据流
+
+    指定 hash_algorithm 时在顺序读取过程中顺带计算整个数据流和每个分卷的哈希。
+    """
+    def __init__(self, paths: list, hash_algorithm: Optional[str] = None) -> None:
+        super().__init__(paths, max_open_files=1)
+        self.hash_algorithm = hash_algorithm
+        self.stream_hash = hashlib.new(hash_algorithm) if hash_algorithm else None
+        self.part_hash = hashlib.new(hash_algorithm) if hash_algorithm else None
+        self.part_digests = []
+
+    def readinto(self, b) -> int:
+        start = self.position
+        n = super().readinto(b)
+        if self.stream_hash is not None:
+            view = memoryview(b).cast('B')[:n]
+            self.stream_hash.update(view)
+            # 按分卷边界切开，分别计入各分卷的哈希
+            done = 0
+            while done < n:
+                index = self.part_at(start + done)
+                end = min(n, self.offsets[index + 1] - start)
+                self.part_hash.update(view[done:end])
+                done = end
+                if start + done == self.offsets[index + 1]:
+                    self.part_digests.append(self.part_hash.hexdigest())
+                    self.part_hash = hashlib.new(self.hash_algorithm)
+        return n
+
+    def finish_hashes(self) -> None:
+        """读完剩余数据，使最后一个分卷的哈希也计算完成"""
+        while self.read(DEFAULT_COPY_BUFFER):
+            pass
+
+
+class SplitStopped(Exception):
+    """用户停止处理时在数据流内部抛出，用于中断打包"""
+
+
+class VolumeWriter:
+    """把连续写入的数据流按分卷大小依次写入多个分卷文件
+
+    用于目录打包等无法预先知道总大小的数据源，写满一个分卷后自动切换到下一个。
+    """
+    def __init__(self, engine: 'SplitEngine', expected_size: int = 0) -> None:
+        self.engine = engine
+        self.expected_size = expected_size
+        # 进度按源数据计算，压缩时由 BlockCompressor 提供已消耗的原始字节数
+        self.consumed = lambda: self.written
+        self.chunk_num = 0
+        self.file = None
+        self.part_bytes = 0
+        self.part_offset = 0
+        self.part_hash = None
+        self.stream_hash = hashlib.new(engine.HASH_ALGORITHM) if engine.manifest else None
+        self.remaining = 0
+        self.written = 0
+
+    def write(self, data) -> int:
+        if self.engine.should_stop():
+            raise SplitStopped()
+        view = memoryview(data).cast('B')
+        total = len(view)
+        while view:
+            if self.remaining == 0:
+                self._next_part()
+            n = min(self.remaining, len(view))
+            self.file.write(view[:n])
+            if self.part_hash is not None:
+                self.part_hash.update(view[:n])
+                self.stream_hash.update(view[:n])
+            view = view[n:]
+            self.remaining -= n
+            self.part_bytes += n
+            self.written += n
+        return total
+
+    def flush(self) -> None:
+        if self.file:
+            self.file.flush()
+
+    def close(self) -> None:
+        self._finish_part()
+
+    def _next_part(self) -> None:
+        self._finish_part()
+        self.chunk_num += 1
+        output_path = Path(self.engine.output_dir) / self.engine.part_name(self.chunk_num)
+        self.file = open(output_path, 'wb')
+        self.part_bytes = 0
+        self.part_offset = self.written
+        if self.stream_hash is not None:
+            self.part_hash = hashlib.new(self.engine.HASH_ALGORITHM)
+        self.remaining = self.engine.plan.nominal_size(self.chunk_num)
+
+    def _finish_part(self) -> None:
+        if self.file is None:
+            return
+        self.file.close()
+        self.file = None
+        digest = self.part_hash.hexdigest() if self.part_hash is not None else None
+        self.engine.report_part(self.chunk_num, self.part_offset, self.part_bytes, digest)
+        self.engine.progress(min(self.consumed(), self.expected_size), self.expected_size)
+
+
+class SplitJournal:
+    """分卷任务日志，分卷和合并共用
+
+    每写完并 fsync 一个分卷就追加一行 JSON 记录。第一行记录源文件特征（大小、修改时间、
+    开头 1MB 的哈希）和分卷参数，重新处理同一个源文件时据此判断能否从缺失的分卷继续。
+    合并时第一行记录各分卷的路径、大小和修改时间，之后每行是一个已写入并 fsync 的分卷。
+    """
+    HEAD_BYTES = 1024 * 1024
+
+    def __init__(self, path: Path, identity: dict) -> None:
+        self.path = path
+        self.identity = identity
+        self.file = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def source_identity(cls, input_file: str, **params) -> dict:
+        stat = os.stat(input_file)
+        head_hash = hashlib.sha256()
+        with open(input_file, 'rb') as f:
+            head_hash.update(f.read(cls.HEAD_BYTES))
+        identity = {
+            'source': os.path.abspath(input_file),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'head_sha256': head_hash.hexdigest(),
+        }
+        identity.update(params)
+        return identity
+
+    @staticmethod
+    def read_identity(path: Path) -> Optional[dict]:
+        """读取日志第一行记录的任务特征，日志不存在或无法解析时返回 None"""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                return json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+
+    def load(self) -> dict:
+        """读取已完成分卷的记录 {序号: 记录}，源文件或参数不一致时返回空字典"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                lines = f.read().splitlines()
+        except FileNotFoundError:
+            return {}
+        records = {}
+        try:
+            if not lines or json.loads(lines[0]) != self.identity:
+                return {}
+            for line in lines[1:]:
+                record = json.loads(line)
+                records[record['index']] = record
+        except ValueError:
+            # 最后一行可能因中断而不完整，之前的记录仍然有效
+            pass
+        return records
+
+    def open(self, completed: dict) -> None:
+        """重写日志（只保留仍然有效的记录），之后以追加方式记录新分卷"""
+        self.file = open(self.path, 'w', encoding='utf-8')
+        self.file.write(json.dumps(self.identity, ensure_ascii=False) + "\n")
+        for index in sorted(completed):
+            self.file.write(json.dumps(completed[index], ensure_ascii=False) + "\n")
+        self._sync()
+
+    def append(self, record: dict) -> None:
+        with self.lock:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self._sync()
+
+    def _sync(self) -> None:
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def remove(self) -> None:
+        self.close()
+        if self.path.exists():
+            self.path.unlink()
+
+
+class SplitEngine:
+    """流式分卷引擎，分卷工具和音视频工具（mp3）共用
+
+    所有分卷共用一个按设置大小分配的缓冲区，内存占用与文件大小无关。
+    workers > 1 时各分卷由线程池按位置独立读写，日志和进度仍按分卷顺序输出。
+    输入为目录时直接以 tar 流写入分卷（名称为 “目录名.tar.part(N)”），不生成临时归档。
+    指定 codec 时先按 BlockCodec 格式分块并行压缩，再把压缩流切分为分卷。
+    manifest 为 True 时在复制过程中顺带计算每个分卷和整个数据流的哈希，
+    完成后写出 “名称.manifest.json” 清单（格式见 README）。
+    普通文件分卷时在输出目录维护 SplitJournal，中断后再次处理同一文件会跳过已完成的分卷。
+    """
+    HASH_ALGORITHM = 'sha256'
+    MANIFEST_FORMAT = 'lanzou-split-manifest'
+    MANIFEST_VERSION = 1
+    # 切点对齐方式，写入分卷任务日志，避免不同切法的分卷被当作同一任务继续
+    ALIGNMENT = None
+
+    def __init__(self, input_file: str, output_dir: str,
+                 initial_bytes: int, step_bytes: int, suffix: str,
+                 buffer_size: int = 4 * 1024 * 1024, workers: int = 1,
+                 codec: str = "", manifest: bool = False, log=None, progress=None, should_stop=None) -> None:
+        self.input_file = input_file
+        self.output_dir = output_dir
+        self.is_directory = os.path.isdir(input_file)
+        self.base_name = Path(input_file).name + ('.tar' if self.is_directory else '')
+        self.initial_bytes = initial_bytes
+        self.step_bytes = step_bytes
+        self.plan = VolumePlan(initial_bytes, step_bytes)
+        self.suffix = suffix
+        self.buffer_size = max(buffer_size, 64 * 1024)
+        self.workers = max(1, workers)
+        self.codec = codec
+        self.manifest = manifest
+        self.records = []
+        self.log = log or (lambda message, error=False: None)
+        self.progress = progress or (lambda done, total: None)
+        self.should_stop = should_stop or (lambda: False)
+
+    @classmethod
+    def from_config(cls, input_file: str, output_dir: str, config, suffix: str,
+                    **kwargs) -> 'SplitEngine':
+        plan = VolumePlan.from_config(config)
+        return cls(input_file, output_dir,
+                   initial_bytes=plan.initial_bytes,
+                   step_bytes=plan.step_bytes,
+                   suffix=suffix,
+                   buffer_size=config.buffer_size,
+                   workers=config.workers,
+                   codec=getattr(config, 'codec', ""),
+                   manifest=getattr(config, 'manifest', False),
+                   **kwargs)
+
+    def part_name(self, chunk_num: int) -> str:
+        return f"{self.base_name}.part({chunk_num}){self.suffix}"
+
+    def manifest_path(self) -> Path:
+        return Path(self.output_dir) / f"{self.base_name}.manifest.json"
+
+    def journal_path(self) -> Path:
+        return Path(self.output_dir) / f"{self.base_name}.journal"
+
+    def run(self) -> dict:
+        """执行分卷，返回统计信息（分卷数、字节数、耗时、峰值内存）"""
+        start = time.perf_counter()
+        if self.is_directory or self.codec:
+            return self._run_stream(start)
+
+        total_size = os.path.getsize(self.input_file)
+        parts = self.build_plan(total_size)
+        params = {'alignment': self.ALIGNMENT} if self.ALIGNMENT else {}
+        journal = SplitJournal(self.journal_path(), SplitJournal.source_identity(
+            self.input_file,
+            initial_bytes=self.initial_bytes,
+            step_bytes=self.step_bytes,
+            suffix=self.suffix,
+            hashed=self.manifest,
+            **params))
+        completed = self.verified_parts(parts, journal.load())
+        journal.open(completed)
+        if completed:
+            first_missing = next((num for num, _, _ in parts if num not in completed), None)
+            if first_missing is not None:
+                self.log(f"♻️ 检测到未完成的分卷任务，已完成 {len(completed)} 个分卷，从第 {first_missing} 卷继续")
+
+        stream_hash = None
+        try:
+            if self.workers > 1 and len(parts) > 1:
+                # 并行模式下各分卷乱序完成，无法一次性计算整个文件的哈希
+                done_parts, done_bytes = self._run_parallel(parts, total_size, journal, completed)
+            else:
+                if self.manifest:
+                    stream_hash = hashlib.new(self.HASH_ALGORITHM)
+                done_parts, done_bytes = self._run_sequential(parts, total_size, journal,
+                                                              completed, stream_hash)
+        finally:
+            journal.close()
+
+        if done_parts == len(parts):
+            journal.remove()
+            if self.manifest:
+                self.write_manifest(total_size, stream_hash.hexdigest() if stream_hash else None)
+
+        return {
+            'parts': done_parts,
+            'bytes': done_bytes,
+            'seconds': time.perf_counter() - start,
+            'buffer_size': self.buffer_size * min(self.workers, max(len(parts), 1)),
+            'peak_memory': peak_memory_bytes(),
+        }
+
+    def virtual_parts(self) -> list:
+        """按分卷计划返回 [(分卷名, PartReader)]，直接读取源文件而不写出分卷
+
+        只适用于未压缩的普通文件；目录和压缩流的分卷内容必须实际生成。
+        """
+        if self.is_directory or self.codec:
+            raise ValueError("目录或压缩分卷无法以虚拟分卷方式读取")
+        plan = self.build_plan(os.path.getsize(self.input_file))
+        return [(self.part_name(index), PartReader(self.input_file, offset, size,
+                                                   self.part_name(index)))
+                for index, offset, size in plan]
+
+    def build_plan(self, total_size: int) -> VolumePlan:
+        """普通文件的分卷边界，子类可以覆盖以调整切点"""
+        return VolumePlan(self.initial_bytes, self.step_bytes, total_size)
+
+    def _run_stream(self, start: float) -> dict:
+        if self.is_directory:
+            expected_size = self.directory_size(self.input_file)
+        else:
+            expected_size = os.path.getsize(self.input_file)
+        writer = VolumeWriter(self, expected_size=expected_size)
+        sink = writer
+        if self.codec:
+            # 未单独设置并行线程时，压缩默认使用全部 CPU 核心
+            workers = self.workers if self.workers > 1 else (os.cpu_count() or 1)
+            sink = BlockCompressor(writer, self.codec, self.buffer_size, workers)
+            writer.consumed = lambda: sink.raw_bytes
+
+        stopped = False
+        try:
+            if self.is_directory:
+                self._write_tar(sink)
+            else:
+                self._write_file(sink)
+            if sink is not writer:
+                sink.close()
+        except SplitStopped:
+            stopped = True
+        finally:
+            if sink is not writer:
+                sink.abort()
+            writer.close()
+
+        if self.manifest and not stopped:
+            self.write_manifest(writer.written, writer.stream_hash.hexdigest())
+
+        return {
+            'parts': writer.chunk_num,
+            'bytes': writer.written,
+            'seconds': time.perf_counter() - start,
+            'buffer_size': self.buffer_size,
+            'peak_memory': peak_memory_bytes(),
+        }
+
+    def _write_tar(self, sink) -> None:
+        def check_stop(tarinfo):
+            if self.should_stop():
+                raise SplitStopped()
+            return tarinfo
+
+        with tarfile.open(fileobj=sink, mode='w|', bufsize=self.buffer_size,
+                          format=tarfile.PAX_FORMAT,
+                          copybufsize=self.buffer_size) as tar:
+            tar.add(self.input_file, arcname=Path(self.input_file).name,
+                    filter=check_stop)
+
+    def _write_file(self, sink) -> None:
+        buffer = bytearray(self.buffer_size)
+        view = memoryview(buffer)
+        with open(self.input_file, 'rb') as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                sink.write(view[:n])
+
+    @staticmethod
+    def directory_size(path: str) -> int:
+        """统计目录下普通文件的总大小，用于估算打包进度"""
+        total = 0
+        stack = [path]
+        while stack:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        total += entry.stat(follow_symlinks=False).st_size
+        return total
+
+    def verified_parts(self, parts: VolumePlan, records: dict) -> dict:
+        """过滤日志记录，只保留与当前分卷计划一致且文件完整存在的分卷"""
+        completed = {}
+        for chunk_num, offset, size in parts:
+            record = records.get(chunk_num)
+            if not record or record['offset'] != offset or record['size'] != size:
+                continue
+            path = Path(self.output_dir) / self.part_name(chunk_num)
+            try:
+                if path.stat().st_size == size:
+                    completed[chunk_num] = record
+            except FileNotFoundError:
+                pass
+        return completed
+
+    def hash_existing_part(self, chunk_num: int, buffer: bytearray, stream_hash) -> None:
+        """续传时把已完成分卷的内容补充进整体哈希（只读不写）"""
+        view = memoryview(buffer)
+        with open(Path(self.output_dir) / self.part_name(chunk_num), 'rb') as f:
+            while True:
+                n = f.readinto(buffer)
+                if not n:
+                    break
+                stream_hash.update(view[:n])
+
+    def _run_sequential(self, parts: VolumePlan, total_size: int, journal: SplitJournal,
+                        completed: dict, stream_hash=None) -> tuple:
+        buffer = bytearray(self.buffer_size)
+        done_parts = 0
+        done_bytes = 0
+        with open(self.input_file, 'rb') as f:
+            for chunk_num, offset, size in parts:
+                if self.should_stop():
+                    break
+                if chunk_num in completed:
+                    digest = completed[chunk_num].get(self.HASH_ALGORITHM)
+                    if stream_hash is not None:
+                        self.hash_existing_part(chunk_num, buffer, stream_hash)
+                    self.report_part(chunk_num, offset, size, digest, skipped=True)
+                else:
+                    digest = self.write_part(f, offset, size, chunk_num, buffer, stream_hash)
+                    journal.append(self.part_record(chunk_num, offset, size, digest))
+                    self.report_part(chunk_num, offset, size, digest)
+
+                done_parts += 1
+                done_bytes = offset + size
+                self.progress(done_bytes, total_size)
+        return done_parts, done_bytes
+
+    def _run_parallel(self, parts: VolumePlan, total_size: int, journal: SplitJournal,
+                      completed: dict) -> tuple:
+        local = threading.local()
+
+        def task(chunk_num: int, offset: int, size: int) -> tuple:
+            if chunk_num in completed:
+                return True, completed[chunk_num].get(self.HASH_ALGORITHM)
+            if self.should_stop():
+                return False, None
+            if not hasattr(local, 'buffer'):
+                local.buffer = bytearray(self.buffer_size)
+            # 每个任务使用独立的文件句柄，按偏移读取，互不影响
+            with open(self.input_file, 'rb') as f:
+                digest = self.write_part(f, offset, size, chunk_num, local.buffer)
+            journal.append(self.part_record(chunk_num, offset, size, digest))
+            return True, digest
+
+        done_parts = 0
+        done_bytes = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(task, *part) for part in parts]
+            try:
+                # 按分卷顺序等待结果，保证日志和进度的输出顺序稳定
+                for (chunk_num, offset, size), future in zip(parts, futures):
+                    finished, digest = future.result()
+                    if not finished:
+                        break
+                    self.report_part(chunk_num, offset, size, digest,
+                                     skipped=chunk_num in completed)
+                    done_parts += 1
+                    done_bytes = offset + size
+                    self.progress(done_bytes, total_size)
+            finally:
+                for future in futures:
+                    future.cancel()
+        return done_parts, done_bytes
+
+    def write_part(self, f, offset: int, size: int, chunk_num: int,
+                   buffer: bytearray, stream_hash=None) -> Optional[str]:
+        """写出一个分卷，启用清单时返回该分卷的哈希"""
+        output_path = Path(self.output_dir) / self.part_name(chunk_num)
+        hashers = ()
+        if self.manifest:
+            part_hash = hashlib.new(self.HASH_ALGORITHM)
+            hashers = (part_hash, stream_hash) if stream_hash else (part_hash,)
+        try:
+            with open(output_path, 'wb') as chunk_file:
+                written = copy_range(f, chunk_file, offset, size, buffer, hashers)
+                os.fsync(chunk_file.fileno())
+            if written != size:
+                raise IOError(f"源文件读取不完整: 期望 {size} 字节, 实际 {written} 字节")
+        except Exception as e:
+            self.log(f"❌ 写入分卷 {chunk_num} 时出错: {str(e)}", error=True)
+            raise
+        return hashers[0].hexdigest() if hashers else None
+
+    def part_record(self, chunk_num: int, offset: int, size: int,
+                    digest: Optional[str] = None) -> dict:
+        return {
+            'index': chunk_num,
+            'name': self.part_name(chunk_num),
+            'offset': offset,
+            'size': size,
+            self.HASH_ALGORITHM: digest,
+        }
+
+    def report_part(self, chunk_num: int, offset: int, size: int,
+                    digest: Optional[str] = None, skipped: bool = False) -> None:
+        self.records.append(self.part_record(chunk_num, offset, size, digest))
+        size_mb = size / (1024 * 1024)
+        if skipped:
+            self.log(f"⏭️ 已存在: {self.part_name(chunk_num)} ({size_mb:.2f}MB)")
+        else:
+            self.log(f"📦 已生成: {self.part_name(chunk_num)} ({size_mb:.2f}MB)")
+
+    def write_manifest(self, total_size: int, stream_digest: Optional[str]) -> None:
+        manifest = {
+            'format': self.MANIFEST_FORMAT,
+            'version': self.MANIFEST_VERSION,
+            'source': Path(self.input_file).name,
+            'source_type': 'directory' if self.is_directory else 'file',
+            'output': self.base_name,
+            'codec': self.codec,
+            'algorithm': self.HASH_ALGORITHM,
+            'size': total_size,
+            self.HASH_ALGORITHM: stream_digest,
+            'initial_bytes': self.initial_bytes,
+            'step_bytes': self.step_bytes,
+            'min_bytes': self.plan.min_bytes,
+            'parts': sorted(self.records, key=lambda record: record['index']),
+        }
+        path = self.manifest_path()
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+        self.log(f"🧾 已生成校验清单: {path.name}")
+
+
+class MpegAudioScanner:
+    """MPEG 音频（mp3）帧扫描
+
+    按帧头算出帧长逐帧跳过，用大块缓冲顺序读一遍文件，不解码音频。
+    开头的 ID3v2 标签和末尾的 ID3v1 标签不参与扫描，也不会被切开。
+    """
+    BITRATES = {
+        (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+        (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+        (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+        (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+        (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+        (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    }
+    SAMPLE_RATES = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+
+    def __init__(self, path: str, buffer_size: int = 4 * 1024 * 1024) -> None:
+        self.path = path
+        self.buffer_size = max(buffer_size, 64 * 1024)
+        self.lengths = {}
+        self.total_size = os.path.getsize(path)
+        with open(path, 'rb') as f:
+            head = f.read(10)
+            self.audio_start = self.id3v2_size(head)
+            f.seek(max(self.total_size - 128, 0))
+            tail = f.read(128)
+        self.audio_end = self.total_size - 128 if tail[:3] == b'TAG' else self.total_size
+
+    @staticmethod
+    def id3v2_size(head: bytes) -> int:
+        """开头 ID3v2 标签的总长度（含标签头和可选的标签尾），没有标签时为 0"""
+        if len(head) < 10 or head[:3] != b'ID3':
+            return 0
+        size = (head[6] & 0x7F) << 21 | (head[7] & 0x7F) << 14 | (head[8] & 0x7F) << 7 | (head[9] & 0x7F)
+        return 10 + size + (10 if head[5] & 0x10 else 0)
+
+    def frame_length(self, b1: int, b2: int) -> int:
+        """由帧头第 2、3 字节算出帧长，不是有效帧头时返回 0"""
+        key = b1 << 8 | b2
+        length = self.lengths.get(key)
+        if length is None:
+            length = 0
+            version, layer_bits = (b1 >> 3) & 3, (b1 >> 1) & 3
+            bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+            if (b1 & 0xE0) == 0xE0 and version != 1 and layer_bits and \
+                    0 < bitrate_index < 15 and rate_index != 3:
+                mpeg1 = version == 3
+                layer = 4 - layer_bits
+                bitrate = self.BITRATES[(mpeg1, layer)][bitrate_index] * 1000
+                rate = self.SAMPLE_RATES[version][rate_index]
+                padding = (b2 >> 1) & 1
+                if layer == 1:
+                    length = (12 * bitrate // rate + padding) * 4
+                else:
+                    factor = 144 if mpeg1 or layer == 2 else 72
+                    length = factor * bitrate // rate + padding
+            self.lengths[key] = length
+        return length
+
+    def frames(self):
+        """依次产生每个音频帧的起始偏移；遇到无效数据时向后搜索下一个连续两帧都有效的位置"""
+        pos = base = self.audio_start
+        buf = b''
+        with open(self.path, 'rb') as f:
+            f.seek(pos)
+            while pos < self.audio_end:
+                rel = pos - base
+                if rel + 8 > len(buf):
+                    if rel >= len(buf):
+                        f.seek(pos)
+                        buf = f.read(self.buffer_size)
+                    else:
+                        buf = buf[rel:] + f.read(self.buffer_size)
+                    base, rel = pos, 0
+                    if len(buf) < 4:
+                        return
+                length = self.frame_length(buf[rel + 1], buf[rel + 2]) if buf[rel] == 0xFF else 0
+                if length and (rel + length + 3 >= len(buf) or pos + length >= self.audio_end or
+                               (buf[rel + length] == 0xFF and
+                                self.frame_length(buf[rel + length + 1], buf[rel + length + 2]))):
+                    yield pos
+                    pos += length
+                    continue
+                found = buf.find(b'\xff', rel + 1)
+                pos = base + (found if found >= 0 else len(buf))
+
+    def plan_offsets(self, plan: VolumePlan) -> array:
+        """按 plan 的递减规则切分，每个切点落在不超过该分卷大小的最后一个帧边界上
+
+        分卷范围内没有帧边界时（超大的标签或无法识别的数据）按字节切开，分卷不会超过计划大小。
+        """
+        offsets = array('Q', [0])
+        index = 1
+        previous = None
+        self.frame_count = 0
+        for boundary in itertools.chain(self.frames(), (self.audio_end, self.total_size)):
+            while boundary > offsets[-1] + plan.nominal_size(index):
+                limit = offsets[-1] + plan.nominal_size(index)
+                offsets.append(previous if previous is not None and previous > offsets[-1] else limit)
+                index += 1
+            previous = boundary
+            self.frame_count += 1
+        self.frame_count -= 2
+        if offsets[-1] < self.total_size:
+            offsets.append(self.total_size)
+        return offsets
+
+
+class Mp3SplitEngine(SplitEngine):
+    """mp3 分卷引擎：切点对齐到 MPEG 帧边界，每个分卷都从完整的帧开始，可以单独播放
+
+    分卷按原文件字节顺序切分，合并后与原文件完全一致；ID3v2 标签和 Xing/Info 帧留在第一个分卷。
+    帧对齐后的分卷大小无法再由分卷规则推算，因此总是生成校验清单，供合并时核对。
+    """
+    ALIGNMENT = 'mpeg-audio-frames'
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.manifest = True
+
+    def build_plan(self, total_size: int) -> VolumePlan:
+        self.log("🔍 正在扫描 MPEG 音频帧...")
+        scanner = MpegAudioScanner(self.input_file, self.buffer_size)
+        offsets = scanner.plan_offsets(self.plan)
+        if scanner.frame_count <= 0:
+            self.log("⚠️ 未识别到 MPEG 音频帧，按字节切分", error=True)
+        return VolumePlan.from_offsets(self.initial_bytes, self.step_bytes, offsets)
+
+
+def preallocate(f, size: int) -> None:
+    """为输出文件预分配空间，不支持 posix_fallocate 时退回到 truncate 设置文件大小"""
+    f.flush()
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(f.fileno(), 0, size)
+            return
+        except OSError as e:
+            if e.errno not in _FALLBACK_ERRNOS:
+                raise
+    f.truncate(size)
+
+
+class HashingWriter:
+    """写入时顺带更新哈希的文件包装"""
+    def __init__(self, file, hasher) -> None:
+        self.file = file
+        self.hasher = hasher
+
+    def write(self, data) -> int:
+        self.hasher.update(data)
+        return self.file.write(data)
+
+
+PART_PATTERN = re.compile(r'^(?P<base>.+?)\.part\((?P<index>\d+)\)(?P<suffix>.*)$')
+
+
+class PartIndex:
+    """分卷文件索引
+
+    用 os.scandir 一次遍历目录，按 (名称, 后缀) 分组、按序号排序，不为每个文件单独 stat。
+    同名但后缀不同的分卷（x.part(1).zip 与 x.part(1).7z）属于不同的组。
+    结果按目录缓存：增删文件都会改变目录的修改时间，修改时间不变时直接复用；返回的是副本。
+    """
+    # 修改时间精度较粗的文件系统上，同一时间刻度内的新文件可能不改变目录修改时间，
+    # 所以修改时间距扫描开始不足这个间隔时不缓存
+    SETTLE_NS = 2 * 10 ** 9
+
+    _cache = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def base_name(path) -> str:
+        name = Path(path).name
+        match = PART_PATTERN.match(name)
+        return match.group('base') if match else name
+
+    @staticmethod
+    def group_key(path) -> tuple:
+        """分卷所属的组 (名称, 后缀)"""
+        name = Path(path).name
+        match = PART_PATTERN.match(name)
+        return (match.group('base'), match.group('suffix')) if match else (name, '')
+
+    @classmethod
+    def scan(cls, directory) -> dict:
+        """返回 {(名称, 后缀): [按序号排列的分卷路径]}，按名称、后缀排序"""
+        directory = os.path.abspath(directory)
+        started = time.time_ns()
+        mtime = os.stat(directory).st_mtime_ns
+        with cls._lock:
+            cached = cls._cache.get(directory)
+        if cached and cached[0] == mtime:
+            return cls._copy(cached[1])
+
+        found = {}
+        match = PART_PATTERN.match
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                result = match(entry.name)
+                if result and entry.is_file():
+                    key = (result.group('base'), result.group('suffix'))
+                    found.setdefault(key, []).append((int(result.group('index')), entry.path))
+        groups = {}
+        for key in sorted(found):
+            groups[key] = [path for _, path in sorted(found[key])]
+
+        if started - mtime > cls.SETTLE_NS:
+            with cls._lock:
+                cls._cache[directory] = (mtime, groups)
+        return cls._copy(groups)
+
+    @staticmethod
+    def _copy(groups: dict) -> dict:
+        # 调用方可能排序或删除列表元素，不能把缓存中的列表交出去
+        return {key: list(files) for key, files in groups.items()}
+
+    @classmethod
+    def related_parts(cls, first_file) -> list:
+        """与给定分卷同名且后缀相同的全部分卷，按序号排列"""
+        return cls.scan(Path(first_file).parent).get(cls.group_key(first_file), [])
+
+
+class DirectoryNotifier:
+    """等待目录变化：Linux 上用 inotify（通过 ctypes 调用 libc），其他平台按间隔轮询"""
+    IN_CLOSE_WRITE = 0x008
+    IN_MOVED_FROM = 0x040
+    IN_MOVED_TO = 0x080
+    IN_CREATE = 0x100
+    IN_DELETE = 0x200
+    # 不监听 IN_MODIFY：下载过程中每次写入都会触发，文件是否还在增长由 FolderWatcher 定时检查
+    WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+
+    def __init__(self, directory) -> None:
+        self.fd = None
+        if not sys.platform.startswith('linux'):
+            return
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+            fd = libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        except (OSError, AttributeError):
+            return
+        if fd < 0:
+            return
+        if libc.inotify_add_watch(fd, os.fsencode(directory), self.WATCH_MASK) < 0:
+            os.close(fd)
+            return
+        self.fd = fd
+
+    @property
+    def uses_inotify(self) -> bool:
+        return self.fd is not None
+
+    def wait(self, timeout: float) -> bool:
+        """等待到目录有变化或超时，返回是否可能有变化（轮询模式总是返回 True）"""
+        if self.fd is None:
+            time.sleep(timeout)
+            return True
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return False
+        # 只关心“有变化”，事件内容不用解析，读空即可
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self) -> None:
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FolderWatcher:
+    """监视目录，分卷组到齐且文件不再变化后交给 on_ready 处理
+
+    判断分卷组是否到齐：有清单时数量和大小必须与清单一致；没有清单时编号连续、后缀一致，
+    且最后一个分卷小于按前两卷推算出的规则大小。只有一卷、或最后一卷恰好等于规则大小时
+    无法判断后面还有没有分卷，这类分卷组要静默更长时间才会处理。
+    on_ready(名称, 分卷列表) 返回 False 表示处理失败，分卷有变化后会重新尝试。
+    """
+    SETTLE_SECONDS = 5.0
+    AMBIGUOUS_SETTLE_SECONDS = 60.0
+    POLL_INTERVAL = 2.0
+
+    def __init__(self, directory: str, on_ready, log=None, should_stop=None,
+                 settle_seconds: float = SETTLE_SECONDS,
+                 ambiguous_settle_seconds: float = AMBIGUOUS_SETTLE_SECONDS,
+                 poll_interval: float = POLL_INTERVAL) -> None:
+        self.directory = directory
+        self.on_ready = on_ready
+        self.log = log or (lambda message, error=False: None)
+        self.should_stop = should_stop or (lambda: False)
+        self.settle_seconds = settle_seconds
+        self.ambiguous_settle_seconds = ambiguous_settle_seconds
+        self.poll_interval = poll_interval
+        self.pending = {}   # (名称, 后缀) -> (文件特征, 特征最后变化的时间)
+        self.handled = {}   # (名称, 后缀) -> 已处理的分卷列表
+        self.failed = {}    # (名称, 后缀) -> 处理失败时的文件特征
+
+    def run(self) -> None:
+        notifier = DirectoryNotifier(self.directory)
+        mode = "inotify" if notifier.uses_inotify else f"每 {self.poll_interval:g} 秒轮询"
+        self.log(f"👁️ 开始监视 {self.directory}（{mode}）")
+        try:
+            changed = True
+            while not self.should_stop():
+                # 没有待定的分卷组且目录无变化时不扫描，空闲时几乎不占 CPU
+                if changed or self.pending:
+                    self.check()
+                timeout = 1.0 if notifier.uses_inotify or self.pending else self.poll_interval
+                changed = notifier.wait(timeout)
+        finally:
+            notifier.close()
+        self.log("👁️ 已停止监视")
+
+    def check(self) -> None:
+        groups = PartIndex.scan(self.directory)
+        now = time.monotonic()
+        for key in list(self.pending):
+            if key not in groups:
+                del self.pending[key]
+        for key, files in groups.items():
+            if self.should_stop():
+                return
+            base = key[0]
+            if self.handled.get(key) == files:
+                continue
+            try:
+                stats = [os.stat(file) for file in files]
+            except FileNotFoundError:
+                continue
+            signature = (tuple(files),
+                         tuple((stat.st_size, stat.st_mtime_ns) for stat in stats))
+            if self.failed.get(key) == signature:
+                continue
+            state = self.completeness(base, files, [stat.st_size for stat in stats])
+            if state is False:
+                self.pending.pop(key, None)
+                continue
+            previous = self.pending.get(key)
+            if previous is None or previous[0] != signature:
+                self.pending[key] = (signature, now)
+                continue
+            settle = self.settle_seconds if state else self.ambiguous_settle_seconds
+            if now - previous[1] < settle:
+                continue
+            del self.pending[key]
+            if self.on_ready(base, list(files)):
+                self.handled[key] = files
+                self.failed.pop(key, None)
+            else:
+                self.failed[key] = signature
+
+    def completeness(self, base: str, files: list, sizes: list) -> Optional[bool]:
+        """True 表示已到齐，False 表示还缺分卷，None 表示无法判断"""
+        indexes, suffixes = [], set()
+        for file in files:
+            match = PART_PATTERN.match(Path(file).name)
+            indexes.append(int(match.group('index')))
+            suffixes.add(match.group('suffix'))
+        if indexes != list(range(1, len(files) + 1)) or len(suffixes) != 1:
+            return False
+        manifest_path = Path(self.directory) / f"{base}.manifest.json"
+        if manifest_path.exists():
+            try:
+                with open(manifest_path, 'r', encoding='utf-8') as f:
+                    records = json.load(f).get('parts', [])
+            except (OSError, ValueError):
+                return False
+            return [record.get('size') for record in records] == sizes
+        if len(sizes) < 2 or MergeEngine.schedule_mismatch(sizes):
+            return None if len(sizes) < 2 else False
+        plan = VolumePlan(sizes[0], sizes[0] - sizes[1])
+        return True if sizes[-1] < plan.nominal_size(len(sizes)) else None
+
+
+class IntegrityError(Exception):
+    """分卷缺失、大小不符或哈希校验失败"""
+
+
+class MergeEngine:
+    """合并引擎：把一组分卷按顺序拼接为输出文件，压缩分卷会边合并边解压
+
+    未压缩的分卷通过 copy_range 复制，同一文件系统内由内核完成，内存占用固定为一个缓冲区。
+    workers > 1 时先按各分卷大小预分配输出文件，再由线程池把每个分卷写到最终偏移处。
+    写入前检查分卷编号是否连续、大小是否符合清单（或由前两卷推算出的分卷规则）；
+    存在清单或 “名称.sha256” 时在合并过程中顺带计算哈希并比对，不额外读一遍数据。
+    未压缩的分卷合并时记录日志，被停止后再次合并同一组分卷会从最后一个完整写入的分卷之后继续。
+    in_place 为 True 时直接把后续分卷追加到 part(1) 末尾，每个分卷落盘后立即删除，
+    额外占用的磁盘空间只有最大的一个分卷。
+    """
+    def __init__(self, files: list, output_path: str,
+                 buffer_size: int = 4 * 1024 * 1024, workers: int = 1,
+                 log=None, progress=None, should_stop=None,
+                 in_place: bool = False) -> None:
+        self.files = list(files)
+        self.output_path = Path(output_path)
+        self.buffer_size = max(buffer_size, 64 * 1024)
+        self.workers = max(1, workers)
+        self.log = log or (lambda message, error=False: None)
+        self.progress = progress or (lambda done, total: None)
+        self.should_stop = should_stop or (lambda: False)
+        match = PART_PATTERN.match(Path(self.files[0]).name)
+        self.base_name = match.group('base') if match else Path(self.files[0]).name
+        self.manifest = self.load_manifest()
+        self.algorithm = (self.manifest or {}).get('algorithm', SplitEngine.HASH_ALGORITHM)
+        self.digest_from_sidecar = False
+        self.expected_digest = self.load_expected_digest()
+        self.expected_part_digests = self.load_expected_part_digests()
+        # 原地合并中途停止后分卷已经删掉一部分，只能继续原地合并
+        self.in_place = in_place or self.in_place_journal_path().exists()
+
+    def load_manifest(self) -> Optional[dict]:
+        path = Path(self.files[0]).parent / f"{self.base_name}.manifest.json"
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if manifest.get('format') != SplitEngine.MANIFEST_FORMAT:
+            return None
+        return manifest
+
+    def is_compressed(self) -> bool:
+        """清单记录了压缩算法时以清单为准，未压缩的分卷即使恰好以魔数开头也不会被当作压缩数据"""
+        if self.manifest is not None:
+            return bool(self.manifest.get('codec'))
+        return BlockCodec.is_compressed(self.files[0])
+
+    def load_expected_digest(self) -> Optional[str]:
+        """整体哈希：优先取清单中的值，其次取 “名称.sha256” 文件（sha256sum 格式）
+
+        清单中的哈希针对分卷拼接后的数据流；.sha256 文件针对合并得到的最终文件，
+        两者只在压缩分卷时不同。
+        """
+        if self.manifest and self.manifest.get(self.algorithm):
+            return self.manifest[self.algorithm]
+        path = Path(self.files[0]).parent / f"{self.base_name}.sha256"
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                content = f.read().split()
+        except OSError:
+            return None
+        if content:
+            self.algorithm = 'sha256'
+            self.digest_from_sidecar = True
+            return content[0].lower()
+        return None
+
+    def load_expected_part_digests(self) -> Optional[list]:
+        if not self.manifest:
+            return None
+        digests = [record.get(self.algorithm) for record in self.manifest.get('parts', [])]
+        return digests if digests and all(digests) else None
+
+    def check_integrity(self, sizes: list) -> None:
+        """写入前检查分卷编号是否连续，以及大小是否与清单或分卷规则一致"""
+        indexes = []
+        for file in self.files:
+            match = PART_PATTERN.match(Path(file).name)
+            indexes.append(int(match.group('index')) if match else 0)
+        if indexes != list(range(1, len(indexes) + 1)):
+            missing = sorted(set(range(1, max(indexes) + 1)) - set(indexes))
+            if missing:
+                names = ", ".join(f"part({index})" for index in missing)
+                raise IntegrityError(f"{self.base_name} 缺少分卷: {names}")
+            raise IntegrityError(f"{self.base_name} 的分卷编号重复或无法识别")
+
+        if self.manifest:
+            records = self.manifest.get('parts', [])
+            if len(records) != len(self.files):
+                raise IntegrityError(f"{self.base_name} 清单记录了 {len(records)} 个分卷，"
+                                     f"实际找到 {len(self.files)} 个")
+            for record, file, size in zip(records, self.files, sizes):
+                if record['size'] != size:
+                    raise IntegrityError(f"{Path(file).name} 大小不符: 清单为 {record['size']} 字节，"
+                                         f"实际为 {size} 字节")
+            self.log("🧾 分卷数量和大小与校验清单一致")
+        else:
+            # 没有清单时大小不符就是唯一的损坏迹象，合并出的文件不可信，不写输出
+            mismatch = self.schedule_mismatch(sizes)
+            if mismatch:
+                raise IntegrityError(f"{self.base_name} {mismatch}（没有校验清单，无法确认分卷完整）")
+
+    @staticmethod
+    def schedule_mismatch(sizes: list) -> Optional[str]:
+        """没有清单时检查分卷大小是否符合递减规则，返回问题描述
+
+        规则分别由前三对相邻分卷（不含最后一卷）推算，取能解释最多分卷的一种，
+        这样 part(1)、part(2) 被截断时也能找到与规则不符的那一卷。分卷少于 4 个时只能由前两卷推算，
+        前两卷的截断只会被当作步长不同，可能无法发现；最后一卷的截断没有清单时无法发现。
+        """
+        if len(sizes) < 2:
+            return None
+        candidates = [(sizes[0], sizes[0] - sizes[1])]
+        # 最后一卷通常不满，不参与推算
+        for first in range(1, min(3, len(sizes) - 2)):
+            step = sizes[first] - sizes[first + 1]
+            candidates.append((sizes[first] + first * step, step))
+        # 其他工具生成的分卷可能小于 1MB，最小分卷大小不能超过实际的非末尾分卷
+        min_bytes = min(VolumePlan.MIN_PART_SIZE, min(sizes[:-1]))
+        best = None
+        for initial, step in candidates:
+            if step < 0:
+                continue
+            plan = VolumePlan(initial, step, min_bytes=min_bytes)
+            bad = [index for index in range(1, len(sizes))
+                   if sizes[index - 1] != plan.nominal_size(index)]
+            if not 0 < sizes[-1] <= plan.nominal_size(len(sizes)):
+                bad.append(len(sizes))
+            if best is None or len(bad) < len(best[1]):
+                best = (plan, bad)
+        if best is None:
+            return "part(2) 比 part(1) 大，分卷可能不完整"
+        plan, bad = best
+        if not bad:
+            return None
+        index = bad[0]
+        limit = "不超过 " if index == len(sizes) else ""
+        return (f"part({index}) 大小为 {sizes[index - 1]} 字节，按分卷规则应为 "
+                f"{limit}{plan.nominal_size(index)} 字节，分卷可能不完整")
+
+    def journal_path(self) -> Path:
+        return self.output_path.with_name(f"{self.output_path.name}.merge.journal")
+
+    def merge_identity(self, sizes: list) -> dict:
+        parts = [[os.path.abspath(file), size, os.stat(file).st_mtime_ns]
+                 for file, size in zip(self.files, sizes)]
+        return {'output': os.path.abspath(self.output_path), 'parts': parts}
+
+    def resumable_parts(self, records: dict, offsets: list, sizes: list) -> dict:
+        """筛选日志中仍然有效的分卷记录：位置、大小一致且数据仍在输出文件中"""
+        if not records or not self.output_path.exists():
+            return {}
+        output_size = os.path.getsize(self.output_path)
+        completed = {}
+        for index, record in records.items():
+            i = index - 1
+            if 0 <= i < len(sizes) and record['offset'] == offsets[i] and \
+                    record['size'] == sizes[i] and offsets[i] + sizes[i] <= output_size:
+                completed[index] = record
+        return completed
+
+    def run(self) -> dict:
+        """执行合并，返回统计信息；completed 为 False 表示被停止"""
+        start = time.perf_counter()
+        if self.in_place:
+            if not self.is_compressed():
+                done_bytes = self._merge_in_place()
+                return {
+                    'completed': not self.should_stop(),
+                    'resumable': True,
+                    'parts': len(self.files),
+                    'bytes': done_bytes,
+                    'seconds': time.perf_counter() - start,
+                    'buffer_size': self.buffer_size,
+                    'peak_memory': peak_memory_bytes(),
+                }
+            self.log("ℹ️ 压缩分卷需要解压，不能原地合并，改为普通合并")
+        sizes = [os.path.getsize(file) for file in self.files]
+        total_size = sum(sizes)
+        self.check_integrity(sizes)
+        offsets = [0]
+        for size in sizes[:-1]:
+            offsets.append(offsets[-1] + size)
+        
+        # 压缩分卷的解压状态无法从中间恢复，只有未压缩的分卷记录合并日志
+        compressed = self.is_compressed()
+        journal = None
+        completed = {}
+        if not compressed:
+            journal = SplitJournal(self.journal_path(), self.merge_identity(sizes))
+            completed = self.resumable_parts(journal.load(), offsets, sizes)
+            journal.open(completed)
+        try:
+            if compressed:
+                done_bytes = self._merge_compressed(total_size)
+            elif self.workers > 1 and len(self.files) > 1 and \
+                    (self.expected_part_digests or not self.expected_digest):
+                done_bytes = self._merge_parallel(sizes, offsets, total_size, journal, completed)
+            else:
+                if self.workers > 1 and len(self.files) > 1:
+                    self.log("ℹ️ 只有整体哈希可用，改为顺序合并以便边合并边校验")
+                done_bytes = self._merge_sequential(sizes, offsets, total_size, journal, completed)
+        except IntegrityError:
+            # 校验失败的输出不可信，删除以免被后续流程误用
+            if journal is not None:
+                journal.remove()
+            if self.output_path.exists():
+                self.output_path.unlink()
+            raise
+        finally:
+            if journal is not None:
+                journal.close()
+        if journal is not None and not self.should_stop():
+            journal.remove()
+                    
+        return {
+            'completed': not self.should_stop(),
+            'resumable': journal is not None,
+            'parts': len(self.files),
+            'bytes': done_bytes,
+            'seconds': time.perf_counter() - start,
+            'buffer_size': self.buffer_size * min(self.workers, len(self.files)),
+            'peak_memory': peak_memory_bytes(),
+        }
+
+    def in_place_journal_path(self) -> Path:
+        return Path(self.files[0]).parent / f"{self.base_name}.inplace.journal"
+
+    def in_place_output(self) -> Path:
+        """原地合并只能在分卷所在的文件系统内重命名，保存位置在其他磁盘时留在分卷目录"""
+        directory = Path(self.files[0]).parent
+        output_dir = self.output_path.parent
+        if output_dir.exists() and os.stat(output_dir).st_dev == os.stat(directory).st_dev:
+            return self.output_path
+        self.log(f"⚠️ 保存位置与分卷不在同一磁盘，合并结果保存在分卷目录: {directory}", error=True)
+        return directory / self.output_path.name
+
+    def _merge_in_place(self) -> int:
+        directory = Path(self.files[0]).parent
+        journal_path = self.in_place_journal_path()
+        identity = SplitJournal.read_identity(journal_path)
+        if identity is None:
+            sizes = [os.path.getsize(file) for file in self.files]
+            self.check_integrity(sizes)
+            identity = {'mode': 'in_place',
+                        'parts': [[Path(file).name, size] for file, size in zip(self.files, sizes)]}
+        else:
+            self.log("♻️ 发现未完成的原地合并，继续合并")
+        # 已删除的分卷也按原来的名称记下，日志和校验信息中的序号保持一致
+        self.files = [str(directory / name) for name, _ in identity['parts']]
+        sizes = [size for _, size in identity['parts']]
+        total_size = sum(sizes)
+        offsets = [0]
+        for size in sizes:
+            offsets.append(offsets[-1] + size)
+            
+        journal = SplitJournal(journal_path, identity)
+        completed = journal.load()
+        resume_from = 1
+        while resume_from + 1 in completed:
+            resume_from += 1
+        target = Path(self.files[0])
+        if not target.exists() or os.path.getsize(target) < offsets[resume_from]:
+            raise IntegrityError(f"{target.name} 比合并日志记录的短，无法继续原地合并")
+        for index, (file, size) in enumerate(zip(self.files, sizes)):
+            if index < resume_from:
+                # 追加并记录后、删除前被中断的分卷
+                if index > 0 and os.path.exists(file):
+                    os.unlink(file)
+            elif not os.path.exists(file) or os.path.getsize(file) != size:
+                raise IntegrityError(f"{Path(file).name} 缺失或大小已改变，无法继续原地合并")
+                
+        stream_hash = None
+        if self.expected_digest and not self.expected_part_digests:
+            stream_hash = hashlib.new(self.algorithm)
+        buffer = bytearray(self.buffer_size)
+        done_bytes = offsets[resume_from]
+        journal.open(completed)
+        try:
+            with open(target, 'r+b') as outfile:
+                # part(1) 自身和已追加的分卷需要补算哈希
+                needs_prefix_hash = stream_hash or (self.expected_part_digests and not completed)
+                if needs_prefix_hash:
+                    part_hash = hashlib.new(self.algorithm)
+                    remaining = done_bytes
+                    while remaining:
+                        n = outfile.readinto(memoryview(buffer)[:min(len(buffer), remaining)])
+                        (stream_hash or part_hash).update(memoryview(buffer)[:n])
+                        remaining -= n
+                    if not stream_hash:
+                        self.verify_part(0, part_hash.hexdigest())
+                outfile.truncate(done_bytes)
+                outfile.seek(done_bytes)
+                self.progress(done_bytes, total_size)
+                
+                for index in range(resume_from, len(self.files)):
+                    if self.should_stop():
+                        break
+                    file, size = self.files[index], sizes[index]
+                    hashers = (stream_hash,) if stream_hash else ()
+                    if self.expected_part_digests:
+                        part_hash = hashlib.new(self.algorithm)
+                        hashers = (part_hash,)
+                    self.copy_part(file, size, outfile, buffer, hashers)
+                    if self.expected_part_digests:
+                        self.verify_part(index, part_hash.hexdigest())
+                    outfile.flush()
+                    os.fsync(outfile.fileno())
+                    journal.append({'index': index + 1, 'offset': offsets[index], 'size': size})
+                    # 数据已落盘并记入日志，源分卷可以删除
+                    os.unlink(file)
+                    done_bytes += size
+                    self.progress(done_bytes, total_size)
+                    self.log(f"📦 已追加并删除: {Path(file).name}")
+        except IntegrityError:
+            # 前面的分卷已经删除，合并结果是唯一的副本，只截掉未通过校验的部分
+            with open(target, 'r+b') as outfile:
+                outfile.truncate(done_bytes)
+            self.log(f"⚠️ 已合并的数据保留在 {target.name}", error=True)
+            raise
+        finally:
+            journal.close()
+            
+        if self.should_stop():
+            self.log(f"⏸️ 已合并的数据保存在 {target.name}，再次合并时继续")
+            return done_bytes
+        if stream_hash:
+            try:
+                self.verify_stream(stream_hash.hexdigest())
+            except IntegrityError:
+                self.log(f"⚠️ 合并结果保留在 {target.name}，未重命名", error=True)
+                raise
+        elif self.expected_part_digests:
+            self.log(f"🔐 {self.algorithm} 校验通过")
+        output = self.in_place_output()
+        os.replace(target, output)
+        journal.remove()
+        self.log(f"📦 原地合并完成: {output.name}")
+        return done_bytes
+
+    def verify_part(self, index: int, digest: str) -> None:
+        expected = self.expected_part_digests[index]
+        if digest != expected:
+            raise IntegrityError(f"{Path(self.files[index]).name} 哈希不符，分卷已损坏")
+
+    def verify_stream(self, digest: str) -> None:
+        if digest != self.expected_digest:
+            raise IntegrityError(f"{self.base_name} 整体哈希不符，合并结果已损坏")
+        self.log(f"🔐 {self.algorithm} 校验通过")
+
+    def _merge_compressed(self, total_size: int) -> int:
+        self.log("🗜️ 检测到压缩分卷，边合并边解压")
+        verify = bool(self.expected_digest or self.expected_part_digests)
+        output_hash = hashlib.new(self.algorithm) if self.digest_from_sidecar else None
+        with open(self.output_path, 'wb') as outfile, \
+                ConcatenatedReader(self.files, self.algorithm if verify else None) as reader:
+            sink = HashingWriter(outfile, output_hash) if output_hash else outfile
+            try:
+                decompress_stream(reader, sink,
+                                  should_stop=self.should_stop,
+                                  progress=lambda: self.progress(reader.position, total_size))
+            except BlockCodecError as e:
+                raise IntegrityError(f"{self.base_name} 解压失败，分卷已损坏: {e}") from e
+            done_bytes = reader.position
+            if verify and not self.should_stop():
+                reader.finish_hashes()
+                if self.expected_part_digests:
+                    for index, digest in enumerate(reader.part_digests):
+                        self.verify_part(index, digest)
+                if output_hash:
+                    self.verify_stream(output_hash.hexdigest())
+                elif self.expected_digest:
+                    self.verify_stream(reader.stream_hash.hexdigest())
+                else:
+                    self.log(f"🔐 {self.algorithm} 校验通过")
+        self.log(f"📦 已合并并解压 {len(self.files)} 个分卷")
+        return done_bytes
+
+    def _merge_sequential(self, sizes: list, offsets: list, total_size: int,
+                          journal: SplitJournal, completed: dict) -> int:
+        buffer = bytearray(self.buffer_size)
+        # 顺序合并只能接着连续完成的分卷往后写，之后的内容截掉重写
+        resume_from = 0
+        while resume_from + 1 in completed:
+            resume_from += 1
+        done_bytes = offsets[resume_from] if resume_from < len(sizes) else total_size
+        # 有分卷哈希时逐卷校验（能定位到具体分卷），否则只算整体哈希
+        stream_hash = None
+        if self.expected_digest and not self.expected_part_digests:
+            stream_hash = hashlib.new(self.algorithm)
+        with open(self.output_path, 'r+b' if resume_from else 'wb') as outfile:
+            if resume_from:
+                if resume_from < len(sizes):
+                    self.log(f"♻️ 前 {resume_from} 个分卷已合并，从 part({resume_from + 1}) 继续")
+                else:
+                    self.log("♻️ 所有分卷此前均已合并")
+                outfile.truncate(done_bytes)
+                if stream_hash:
+                    self.log("🔍 重新计算已合并部分的哈希...")
+                    remaining = done_bytes
+                    while remaining:
+                        n = outfile.readinto(memoryview(buffer)[:min(len(buffer), remaining)])
+                        stream_hash.update(memoryview(buffer)[:n])
+                        remaining -= n
+                outfile.seek(done_bytes)
+                self.progress(done_bytes, total_size)
+            for index, (file, size) in enumerate(zip(self.files, sizes)):
+                if index < resume_from:
+                    continue
+                if self.should_stop():
+                    break
+                hashers = (stream_hash,) if stream_hash else ()
+                if self.expected_part_digests:
+                    part_hash = hashlib.new(self.algorithm)
+                    hashers = (part_hash,)
+                self.copy_part(file, size, outfile, buffer, hashers)
+                if self.expected_part_digests:
+                    self.verify_part(index, part_hash.hexdigest())
+                outfile.flush()
+                os.fsync(outfile.fileno())
+                journal.append({'index': index + 1, 'offset': offsets[index], 'size': size})
+                done_bytes += size
+                self.progress(done_bytes, total_size)
+                self.log(f"📦 已合并: {Path(file).name}")
+        if not self.should_stop():
+            if stream_hash:
+                self.verify_stream(stream_hash.hexdigest())
+            elif self.expected_part_digests:
+                self.log(f"🔐 {self.algorithm} 校验通过")
+        return done_bytes
+
+    def _merge_parallel(self, sizes: list, offsets: list, total_size: int,
+                        journal: SplitJournal, completed: dict) -> int:
+        # 继续合并时保留已写入的分卷，只补齐文件大小
+        with open(self.output_path, 'r+b' if completed else 'wb') as outfile:
+            preallocate(outfile, total_size)
+            outfile.truncate(total_size)
+        if completed:
+            self.log(f"♻️ {len(completed)} 个分卷已合并，继续合并其余分卷")
+            
+        local = threading.local()
+
+        def task(index: int, file: str, offset: int, size: int) -> bool:
+            if index + 1 in completed:
+                return True
+            if self.should_stop():
+                return False
+            if not hasattr(local, 'buffer'):
+                local.buffer = bytearray(self.buffer_size)
+            hashers = ()
+            if self.expected_part_digests:
+                part_hash = hashlib.new(self.algorithm)
+                hashers = (part_hash,)
+            # 每个任务使用独立的输出句柄，定位到该分卷的最终偏移后写入
+            with open(self.output_path, 'r+b') as outfile:
+                outfile.seek(offset)
+                self.copy_part(file, size, outfile, local.buffer, hashers)
+                if hashers:
+                    self.verify_part(index, part_hash.hexdigest())
+                outfile.flush()
+                os.fsync(outfile.fileno())
+            journal.append({'index': index + 1, 'offset': offset, 'size': size})
+            return True
+
+        done_bytes = 0
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = [pool.submit(task, index, *job)
+                       for index, job in enumerate(zip(self.files, offsets, sizes))]
+            try:
+                # 按分卷顺序汇报，日志顺序与顺序合并一致
+                for index, (file, size, future) in enumerate(zip(self.files, sizes, futures)):
+                    if not future.result():
+                        break
+                    done_bytes += size
+                    self.progress(done_bytes, total_size)
+                    if index + 1 not in completed:
+                        self.log(f"📦 已合并: {Path(file).name}")
+            finally:
+                for future in futures:
+                    future.cancel()
+        if self.expected_part_digests and not self.should_stop():
+            self.log(f"🔐 {self.algorithm} 校验通过")
+        return done_bytes
+
+    @staticmethod
+    def copy_part(file: str, size: int, outfile, buffer: bytearray,
+                  hashers: tuple = ()) -> None:
+        with open(file, 'rb') as infile:
+            copied = copy_range(infile, outfile, 0, size, buffer, hashers)
+        if copied != size:
+            raise IOError(f"分卷 {Path(file).name} 读取不完整: 期望 {size} 字节, 实际 {copied} 字节")
+
+
+def is_rotational(path: str) -> Optional[bool]:
+    """判断路径所在的块设备是否为机械硬盘，无法判断时返回 None（目前只支持 Linux）"""
+    try:
+        dev = os.stat(path).st_dev
+        sys_path = Path(f"/sys/dev/block/{os.major(dev)}:{os.minor(dev)}")
+        for candidate in (sys_path / 'queue' / 'rotational',
+                          sys_path.resolve().parent / 'queue' / 'rotational'):
+            if candidate.exists():
+                return candidate.read_text().strip() == '1'
+    except (OSError, AttributeError):
+        pass
+    return None
+
+
+def default_media_workers(io_bound: bool) -> int:
+    """并行提取音视频分段的默认进程数：重新编码等 CPU 密集任务取核心数，流复制等 I/O 密集任务最多 4 个"""
+    cores = os.cpu_count() or 1
+    return min(4, cores) if io_bound else cores
+
+
+class DeviceThrottle:
+    """按存储设备限制并发：同一块机械硬盘上同时只允许一个任务，避免磁头来回寻道"""
+    def __init__(self, rotational_limit: int = 1) -> None:
+        self.rotational_limit = rotational_limit
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def _semaphore(self, path: str):
+        dev = os.stat(path).st_dev
+        with self.lock:
+            if dev not in self.semaphores:
+                limited = is_rotational(path)
+                self.semaphores[dev] = (threading.Semaphore(self.rotational_limit)
+                                        if limited else None)
+            return dev, self.semaphores[dev]
+
+    @contextmanager
+    def hold(self, paths: list):
+        """占用 paths 涉及的所有设备；按设备号顺序获取，避免互相等待造成死锁"""
+        devices = dict(self._semaphore(path) for path in paths)
+        acquired = []
+        try:
+            for dev in sorted(devices):
+                if devices[dev] is not None:
+                    devices[dev].acquire()
+                    acquired.append(devices[dev])
+            yield
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+
+
+def format_memory(stats: dict) -> str:
+    """把引擎统计中的内存信息格式化为日志文本"""
+    text = f"缓冲区 {stats['buffer_size'] / (1024 * 1024):.0f}MB"
+    if stats.get('peak_memory'):
+        text += f"，进程峰值内存 {stats['peak_memory'] / (1024 * 1024):.1f}MB"
+    return text
+
+
+@functools.lru_cache(maxsize=None)
+def media_tools() -> dict:
+    """查找 ffmpeg 和 ffprobe 的路径，每个进程只查一次；未安装的值为 None"""
+    return {name: shutil.which(name) for name in ('ffmpeg', 'ffprobe')}
+
+
+def media_tool(name: str) -> str:
+    """返回 ffmpeg / ffprobe 的完整路径，未安装时给出明确的错误"""
+    path = media_tools()[name]
+    if path is None:
+        raise RuntimeError(f"未检测到 {name}，请先安装 ffmpeg 并确保其在系统 PATH 中")
+    return path
+
+
+class ProbeCache:
+    """磁盘上的 ffprobe 结果缓存，按路径、大小和修改时间识别文件
+
+    每个文件一个 JSON，文件名取路径的 SHA-1；文件被修改后大小或修改时间不一致，旧记录自动失效。
+    """
+    DIRECTORY = Path.home() / ".lanzou_tools" / "probe_cache"
+
+    def __init__(self, directory: Optional[Path] = None) -> None:
+        self.directory = Path(directory or self.DIRECTORY)
+
+    def _entry_path(self, path: str) -> Path:
+        key = hashlib.sha1(os.path.abspath(path).encode('utf-8', 'surrogatepass')).hexdigest()
+        return self.directory / f"{key}.json"
+
+    def get(self, path: str) -> dict:
+        """返回仍然有效的缓存记录，没有时返回空字典"""
+        try:
+            st = os.stat(path)
+            with open(self._entry_path(path), 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if (entry.get('path') != os.path.abspath(path) or entry.get('size') != st.st_size
+                or entry.get('mtime_ns') != st.st_mtime_ns):
+            return {}
+        return entry
+
+    def update(self, path: str, **fields) -> None:
+        """把 fields 合并进该文件的记录；写入失败只影响缓存，不影响处理"""
+        entry = self.get(path)
+        try:
+            st = os.stat(path)
+            entry.update(fields, path=os.path.abspath(path),
+                         size=st.st_size, mtime_ns=st.st_mtime_ns)
+            self.directory.mkdir(parents=True, exist_ok=True)
+            target = self._entry_path(path)
+            temp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(temp, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(temp, target)
+        except OSError:
+            pass
+
+
+PROBE_CACHE = ProbeCache()
+
+
+def probe_media(input_file: str, cache: ProbeCache = PROBE_CACHE) -> dict:
+    """读取时长、码率和流信息，一次 ffprobe 调用，结果进入缓存"""
+    entry = cache.get(input_file)
+    if 'duration' in entry:
+        return entry
+    result = subprocess.run(
+        [media_tool('ffprobe'), '-v', 'error', '-show_entries',
+         'format=duration,bit_rate:stream=index,codec_type', '-of', 'json', input_file],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    data = json.loads(result.stdout or '{}')
+    fmt = data.get('format', {})
+    if result.returncode != 0 or 'duration' not in fmt:
+        raise RuntimeError(f"ffprobe 无法读取媒体信息: {result.stderr.strip()}")
+    info = {
+        'duration': float(fmt['duration']),
+        'bit_rate': int(fmt['bit_rate']) if str(fmt.get('bit_rate', '')).isdigit() else None,
+        'streams': [{'index': stream.get('index'), 'codec_type': stream.get('codec_type', '')}
+                    for stream in data.get('streams', [])],
+    }
+    cache.update(input_file, **info)
+    entry.update(info)
+    return entry
+
+
+class MediaCutPlanner:
+    """按数据包大小规划音视频分段的切点
+
+    用 ffprobe 读一遍全部数据包的时间和大小，以及视频关键帧的时间，存入紧凑数组（每个包十几字节）。
+    按时间排序后求前缀和，任意时间点之前的数据量可以二分查找得到。每个分段的字节预算取自
+    VolumePlan 的递减规则，在预算内选最远的关键帧切开；按平均码率换算时长对可变码率的内容误差很大。
+    """
+    # 每个分段的容器开销（文件头、索引），从预算中预留
+    OVERHEAD_RATIO = 0.01
+    OVERHEAD_BYTES = 256 * 1024
+    # 切点略早于关键帧时间，避免时间格式化后的舍入越过关键帧，被推迟到下一个关键帧
+    CUT_EPSILON = 0.001
+
+    def __init__(self, times: array, sizes: array, keyframes: array, duration: float) -> None:
+        order = sorted(range(len(times)), key=times.__getitem__)
+        self.times = array('d', (times[i] for i in order))
+        self.prefix = array('Q', [0])
+        for i in order:
+            self.prefix.append(self.prefix[-1] + sizes[i])
+        self.keyframes = array('d', sorted(keyframes))
+        self.duration = duration
+
+    @classmethod
+    def load(cls, input_file: str, cache: ProbeCache = PROBE_CACHE) -> 'MediaCutPlanner':
+        """优先使用缓存的关键帧索引，没有时读取数据包并写入缓存"""
+        info = probe_media(input_file, cache)
+        if 'keyframe_index' in info:
+            return cls.from_index(info['keyframe_index'], info['duration'])
+        planner = cls.probe(input_file, info['duration'], info['streams'])
+        cache.update(input_file, keyframe_index=planner.to_index())
+        return planner
+
+    @classmethod
+    def probe(cls, input_file: str, duration: float,
+              stream_info: Optional[list] = None) -> 'MediaCutPlanner':
+        """运行 ffprobe 读取数据包信息，逐行解析，不保留原始输出"""
+        if stream_info is None:
+            stream_info = probe_media(input_file)['streams']
+        streams = {str(stream['index']): stream['codec_type'] for stream in stream_info}
+        # 没有视频流时（纯音频）每个包都可以作为切点
+        key_streams = {index for index, kind in streams.items() if kind == 'video'} or set(streams)
+
+        times, sizes, keyframes = array('d'), array('Q'), array('d')
+        process = subprocess.Popen(
+            [media_tool('ffprobe'), '-v', 'error',
+             '-show_entries', 'packet=stream_index,pts_time,dts_time,size,flags',
+             '-of', 'compact=p=0', input_file],
+            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        with process.stdout:
+            for line in process.stdout:
+                fields = dict(item.split('=', 1) for item in line.rstrip().split('|') if '=' in item)
+                time_text = fields.get('pts_time', 'N/A')
+                if time_text == 'N/A':
+                    time_text = fields.get('dts_time', 'N/A')
+                if time_text == 'N/A' or not fields.get('size', '').isdigit():
+                    continue
+                packet_time = float(time_text)
+                times.append(packet_time)
+                sizes.append(int(fields['size']))
+                if fields.get('stream_index') in key_streams and 'K' in fields.get('flags', ''):
+                    keyframes.append(packet_time)
+        if process.wait() != 0 or not times:
+            raise RuntimeError("ffprobe 无法读取数据包信息")
+        return cls(times, sizes, keyframes, duration)
+
+    def to_index(self) -> dict:
+        """规划只在关键帧处查询数据量，缓存关键帧时间和之前的数据量即可，不必保存每个包"""
+        return {
+            'keyframes': self.keyframes.tolist(),
+            'offsets': [self.bytes_before(t) for t in self.keyframes],
+            'total': self.prefix[-1],
+        }
+
+    @classmethod
+    def from_index(cls, index: dict, duration: float) -> 'MediaCutPlanner':
+        """由 to_index 的结果重建，关键帧处的 bytes_before 与完整数据一致"""
+        planner = cls.__new__(cls)
+        planner.times = array('d', index['keyframes'])
+        planner.prefix = array('Q', index['offsets'] + [index['total']])
+        planner.keyframes = array('d', index['keyframes'])
+        planner.duration = duration
+        return planner
+
+    def bytes_before(self, t: float) -> int:
+        return self.prefix[bisect.bisect_left(self.times, t)]
+
+    def budget(self, plan: VolumePlan, index: int) -> int:
+        nominal = plan.nominal_size(index)
+        return max(int(nominal * (1 - self.OVERHEAD_RATIO)) - self.OVERHEAD_BYTES, nominal // 2)
+
+    def plan_cuts(self, plan: VolumePlan, log=None) -> list:
+        """返回各分段的切点时间（不含 0），分段数为切点数加 1"""
+        log = log or (lambda message, error=False: None)
+        cuts = []
+        start = 0.0
+        start_bytes = 0
+        total_bytes = self.prefix[-1]
+        index = 1
+        while total_bytes - start_bytes > self.budget(plan, index):
+            limit = start_bytes + self.budget(plan, index)
+            first = bisect.bisect_right(self.keyframes, start)
+            # 关键帧时间递增，之前的数据量也递增，二分找预算内最远的关键帧
+            lo, hi = first, len(self.keyframes)
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self.bytes_before(self.keyframes[mid]) <= limit:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo > first:
+                cut = self.keyframes[lo - 1]
+            elif first < len(self.keyframes):
+                # 两个关键帧之间的数据就超过预算，只能在下一个关键帧切开
+                cut = self.keyframes[first]
+                log(f"⚠️ part({index}) 关键帧间隔过大，分段将超出计划大小", error=True)
+            else:
+                break
+            cuts.append(cut)
+            start = cut
+            start_bytes = self.bytes_before(cut)
+            index += 1
+        return cuts
+
+    def segment_sizes(self, cuts: list) -> list:
+        """各分段的预计数据量（不含容器开销）"""
+        bounds = [0] + [self.bytes_before(cut) for cut in cuts] + [self.prefix[-1]]
+        return [bounds[i + 1] - bounds[i] for i in range(len(bounds) - 1)]
+
+    def cut_times(self, cuts: list) -> list:
+        """传给 ffmpeg -segment_times 的时间点"""
+        return [max(cut - self.CUT_EPSILON, 0.0) for cut in cuts]
 
 # 第二部分：MainApplication 類
 class MainApplication:
+    # 单个文件的上传上限（MB），更大的文件按分卷计划直接上传
+    UPLOAD_MAX_MB = 100
+
     def __init__(self):
         self.window = tk.Tk()
         self.setup_window()
@@ -45,7 +2316,7 @@ class MainApplication:
         # 初始化蓝奏云API
         self.lanzou = LanZouCloud()
         self.lanzou.ignore_limits()  # 解除官方限制
-        self.lanzou.set_max_size(100)  # 设置最大文件大小
+        self.lanzou.set_max_size(self.UPLOAD_MAX_MB)  # 设置最大文件大小
         self.lanzou.set_upload_delay((0, 0))  # 设置上传延时
         self.lanzou.is_logged_in = False  # 初始化登录状态
     
@@ -174,7 +2445,8 @@ class MainApplication:
         cloud_tools = [
             ("📂 全部文件", self.show_all_files),
             ("⬆️ 上传文件", self.show_upload_dialog),
-            ("⬇️ 下载文件", self.show_download_dialog)
+            ("⬇️ 下载文件", self.show_download_dialog),
+            ("⚙️ 设置", self.show_settings)
         ]
         
         for text, command in cloud_tools:
@@ -370,12 +2642,58 @@ class MainApplication:
             filetypes=[("所有文件", "*.*")]
         )
         
-        if file_path:
-            result = self.lanzou.upload_file(file_path)
-            if result['code'] == 1:
-                messagebox.showinfo("成功", "文件上传成功！")
-            else:
-                messagebox.showerror("错误", f"上传失败: {result['message']}")
+        if not file_path:
+            return
+        if os.path.getsize(file_path) > self.UPLOAD_MAX_MB * 1024 * 1024:
+            self.upload_in_parts(file_path)
+            return
+        try:
+            result = self.transfer_api().upload_file(file_path)
+        except Exception as e:
+            messagebox.showerror("错误", f"上传失败: {str(e)}")
+            return
+        if result['code'] == 1:
+            messagebox.showinfo("成功", "文件上传成功！")
+        else:
+            messagebox.showerror("错误", f"上传失败: {result['message']}")
+
+    def transfer_api(self) -> 'LanzouAPI':
+        """上传和边下边合并使用的接口：LanZouCloud 没有流式上传和分段下载，复用它登录后的会话"""
+        session = getattr(self.lanzou, '_session', None)
+        if session is None:
+            raise RuntimeError("当前蓝奏云客户端没有可复用的登录会话，请重新登录")
+        return LanzouAPI.from_session(session)
+
+    def upload_in_parts(self, file_path: str) -> None:
+        """超过上传上限的文件按分卷计划从源文件读取各分卷上传，本地不生成分卷文件"""
+        part_mb = simpledialog.askfloat(
+            "分卷上传",
+            f"文件超过 {self.UPLOAD_MAX_MB}MB，将直接从源文件分卷上传（不在本地生成分卷）。\n"
+            "每个分卷的大小（MB）：",
+            initialvalue=self.UPLOAD_MAX_MB, minvalue=1, maxvalue=self.UPLOAD_MAX_MB,
+            parent=self.window)
+        if not part_mb:
+            return
+        try:
+            api = self.transfer_api()
+        except Exception as e:
+            messagebox.showerror("错误", f"分卷上传失败: {str(e)}")
+            return
+        engine = SplitEngine(file_path, str(Path(file_path).parent),
+                             initial_bytes=int(part_mb * 1024 * 1024), step_bytes=0,
+                             suffix=".zip", buffer_size=parse_size(APP_SETTINGS.buffer_size))
+        
+        def upload():
+            try:
+                file_ids = api.upload_virtual_parts(engine)
+                title, message, show = "成功", f"已上传 {len(file_ids)} 个分卷", messagebox.showinfo
+            except Exception as e:
+                title, message, show = "错误", f"分卷上传失败: {str(e)}", messagebox.showerror
+            self.window.after(0, lambda: show(title, message))
+            
+        thread = threading.Thread(target=upload)
+        thread.daemon = True
+        thread.start()
 
     def show_download_dialog(self):
         if not hasattr(self, 'lanzou') or not self.lanzou.is_logged_in:
@@ -411,7 +2729,7 @@ class MainApplication:
         tree.pack(side='left', fill='both', expand=True)
         
         # 获取并显示文件列表
-        files = self.lanzou.get_file_list()
+        files = self.list_files()
         for file in files:
             tree.insert('', 'end', values=(
                 file['name'],
@@ -435,6 +2753,13 @@ class MainApplication:
                 messagebox.showerror("错误", "未找到文件信息")
                 return
             
+            match = PART_PATTERN.match(file_info['name'])
+            if match and messagebox.askyesno(
+                    "分卷文件", "所选文件是分卷，是否下载同组的全部分卷并直接合并？\n"
+                                "（分卷不保存到本地）"):
+                download_parts(match.group('base'), match.group('suffix'))
+                return
+            
             # 选择保存位置
             save_path = filedialog.asksaveasfilename(
                 title="保存文件",
@@ -452,6 +2777,19 @@ class MainApplication:
                 except Exception as e:
                     messagebox.showerror("错误", f"下载出错: {str(e)}")
         
+        def download_parts(base_name: str, suffix: str):
+            save_path = filedialog.asksaveasfilename(title="保存合并后的文件",
+                                                     initialfile=base_name)
+            if not save_path:
+                return
+            try:
+                api = self.transfer_api()
+            except Exception as e:
+                messagebox.showerror("错误", f"下载合并出错: {str(e)}")
+                return
+            dialog.destroy()
+            self.download_and_merge_parts(api, list(files), base_name, suffix, save_path)
+        
         # 按钮框架
         button_frame = ttk.Frame(dialog)
         button_frame.pack(fill='x', padx=10, pady=10)
@@ -478,7 +2816,7 @@ class MainApplication:
             
             # 重新获取文件列表
             nonlocal files
-            files = self.lanzou.get_file_list()
+            files = self.list_files()
             for file in files:
                 tree.insert('', 'end', values=(
                     file['name'],
@@ -487,6 +2825,59 @@ class MainApplication:
                     file['downs']
                 ), tags=('file',))
 
+    def list_files(self) -> list:
+        """网盘文件列表，统一为字典（LanZouCloud 返回的是 File 命名元组）"""
+        return [LanzouAPI.file_entry(info) for info in self.lanzou.get_file_list()]
+
+    def download_and_merge_parts(self, api: 'LanzouAPI', files: list, base_name: str,
+                                 suffix: str, save_path: str) -> None:
+        """后台下载一组分卷并直接合并，进度窗口显示日志和进度，可以随时停止"""
+        window = tk.Toplevel(self.window)
+        window.title("下载合并")
+        window.geometry("420x140")
+        window.resizable(False, False)
+        status = ttk.Label(window, text=f"正在下载 {base_name} 的分卷...",
+                           style='Custom.TLabel', wraplength=400)
+        status.pack(fill='x', padx=10, pady=(10, 5))
+        progress_var = tk.DoubleVar(value=0)
+        ttk.Progressbar(window, variable=progress_var, maximum=100).pack(fill='x', padx=10, pady=5)
+        stop_flag = threading.Event()
+
+        def stop():
+            stop_flag.set()
+            status.config(text="正在停止...")
+
+        stop_button = ttk.Button(window, text="停止", style='Custom.TButton', command=stop)
+        stop_button.pack(pady=5)
+        window.protocol("WM_DELETE_WINDOW", stop)
+
+        def log(message, error=False):
+            self.window.after(0, lambda: status.config(
+                text=message, foreground='red' if error else '#333333'))
+
+        def progress(done, total):
+            if total:
+                self.window.after(0, lambda: progress_var.set(done * 100 / total))
+
+        def finish(title, message, show):
+            window.destroy()
+            show(title, message)
+
+        def run():
+            try:
+                if api.download_and_merge(files, base_name, suffix, save_path, log=log,
+                                          progress=progress, should_stop=stop_flag.is_set):
+                    title, message, show = "成功", f"{base_name} 下载合并完成！", messagebox.showinfo
+                else:
+                    title, message, show = "提示", "下载合并已停止", messagebox.showinfo
+            except Exception as e:
+                title, message, show = "错误", f"下载合并出错: {str(e)}", messagebox.showerror
+            self.window.after(0, lambda: finish(title, message, show))
+
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
     def create_file_manager(self):
         """创建文件管理器界面"""
         # 清空当前内容区域
@@ -871,7 +3262,7 @@ class SettingsDialog:
         self.media_size_unit = tk.StringVar(value="MB")
         
         # 缓冲区大小
-        self.buffer_size = tk.StringVar(value="4MB")
+        self.buffer_size = tk.StringVar(value=APP_SETTINGS.buffer_size)
         
     def create_widgets(self):
         notebook = ttk.Notebook(self.dialog)
@@ -1084,6 +3475,7 @@ class SettingsDialog:
     def save_settings(self):
         # 这里可以添加保存设置到配置文件的代码
         # 例如可以使用 json 或 ini 格式保存设置
+        APP_SETTINGS.buffer_size = self.buffer_size.get()
         self.dialog.destroy()
 
 # 在这里放入 MainApplication 类的代码
@@ -1104,6 +3496,9 @@ class LanzouCompressor:
         self.initial_size_var = tk.StringVar(value="99")
         self.step_reduction_var = tk.StringVar(value="10.24")
         self.size_unit = tk.StringVar(value="MB")
+        self.workers_var = tk.StringVar(value="1")
+        self.codec_var = tk.StringVar(value="无")
+        self.manifest_var = tk.BooleanVar(value=False)
         self.progress_var = tk.DoubleVar(value=0)
         self.output_path_var = tk.StringVar(value=self.output_dir)
         
@@ -1235,10 +3630,46 @@ class LanzouCompressor:
                  textvariable=self.custom_suffix,
                  width=8).pack(side='left')
         
+        # Parallel Workers
+        workers_frame = ttk.Frame(left_frame)
+        workers_frame.pack(side='left', padx=(15, 0))
+        
+        ttk.Label(workers_frame,
+                 text="并行线程:",
+                 style='Custom.TLabel').pack(side='left', padx=(0, 5))
+        
+        ttk.Entry(workers_frame,
+                 textvariable=self.workers_var,
+                 width=4).pack(side='left')
+        
+        # Compression Codec
+        codec_frame = ttk.Frame(left_frame)
+        codec_frame.pack(side='left', padx=(15, 0))
+        
+        ttk.Label(codec_frame,
+                 text="压缩:",
+                 style='Custom.TLabel').pack(side='left', padx=(0, 5))
+        
+        ttk.Combobox(codec_frame,
+                    textvariable=self.codec_var,
+                    values=["无"] + list(BlockCodec.CODECS),
+                    state="readonly",
+                    width=6).pack(side='left')
+        
+        ttk.Checkbutton(left_frame,
+                       text="生成校验清单",
+                       variable=self.manifest_var).pack(side='left', padx=(15, 0))
+        
         # Right Section - Operation Buttons
         right_frame = ttk.Frame(main_container)
         right_frame.pack(side='right')
         
+        preview_button = ttk.Button(right_frame,
+                                  text="预览分卷",
+                                  style='Custom.TButton',
+                                  command=self.preview_plan)
+        preview_button.pack(side='left', padx=(0, 5))
+        
         start_button = ttk.Button(right_frame,
                                 text="开始处理",
                                 style='Custom.TButton',
@@ -1268,17 +3699,29 @@ class LanzouCompressor:
         try:
             initial_size = float(self.initial_size_var.get())
             step_reduction = float(self.step_reduction_var.get())
+            workers = int(self.workers_var.get())
             
             if initial_size <= 0:
                 raise ValueError("初始大小必须大于0")
             if step_reduction <= 0:
                 raise ValueError("递减步长必须大于0")
+            if workers <= 0:
+                raise ValueError("并行线程数必须大于0")
+            codec = "" if self.codec_var.get() == "无" else self.codec_var.get()
+            buffer_size = parse_size(APP_SETTINGS.buffer_size)
+            if codec:
+                # 压缩块与缓冲区同样大小
+                BlockCodec.check_block_size(buffer_size)
                 
             return CompressionConfig(
                 initial_size=initial_size,
                 step_reduction=step_reduction,
                 size_unit=self.size_unit.get(),
-                custom_suffix=self.custom_suffix.get()
+                custom_suffix=self.custom_suffix.get(),
+                buffer_size=buffer_size,
+                workers=workers,
+                codec=codec,
+                manifest=self.manifest_var.get()
             )
         except ValueError as e:
             messagebox.showerror("错误", f"无效的输入值: {str(e)}")
@@ -1286,39 +3729,20 @@ class LanzouCompressor:
             
     def process_file(self, config: CompressionConfig) -> None:
         try:
-            if config.size_unit == "GB":
-                unit_factor = 1024 * 1024 * 1024
-            elif config.size_unit == "MB":
-                unit_factor = 1024 * 1024
-            else:  # KB
-                unit_factor = 1024
-                
-            initial_bytes = int(config.initial_size * unit_factor)
-            step_bytes = int(config.step_reduction * 1024)
-            
-            total_size = os.path.getsize(self.input_file)
-            chunk_num = 1
-            offset = 0
-            
-            with open(self.input_file, 'rb') as f:
-                while offset < total_size and not self.stop_flag:
-                    current_size = max(
-                        initial_bytes - (chunk_num - 1) * step_bytes,
-                        1024 * 1024  # Minimum 1MB
-                    )
-                    current_size = min(current_size, total_size - offset)
-                    
-                    self.write_chunk(f, offset, current_size, chunk_num, config)
-                    
-                    offset += current_size
-                    chunk_num += 1
-                    
-                    # Update progress
-                    progress = (offset / total_size) * 100
-                    self.progress_var.set(progress)
-                    self.progress_label.config(text=f"{progress:.1f}%")
+            engine = SplitEngine.from_config(
+                self.input_file, self.output_dir, config, config.custom_suffix,
+                log=self.log,
+                progress=self.update_progress,
+                should_stop=lambda: self.stop_flag
+            )
+            if engine.is_directory:
+                self.log(f"📁 目录将以 tar 流直接写入分卷: {engine.base_name}")
+            if engine.codec:
+                self.log(f"🗜️ 使用 {engine.codec} 分块压缩")
+            stats = engine.run()
                     
             if not self.stop_flag:
+                self.log(f"📊 {format_memory(stats)}")
                 self.log("✅ 处理完成!")
                 messagebox.showinfo("完成", "文件处理已完成!")
             else:
@@ -1331,24 +3755,60 @@ class LanzouCompressor:
             self.is_processing = False
             self.progress_label.config(text="0%")
             
-    def write_chunk(self, f: object, offset: int, size: int,
-                   chunk_num: int, config: CompressionConfig) -> None:
-        try:
-            f.seek(offset)
-            data = f.read(size)
+    def update_progress(self, done: int, total: int) -> None:
+        progress = (done / total) * 100 if total else 100
+        self.progress_var.set(progress)
+        self.progress_label.config(text=f"{progress:.1f}%")
+        
+    def preview_plan(self) -> None:
+        """不写任何文件，只按当前设置列出分卷计划"""
+        config = self.validate_inputs()
+        if not config:
+            return
+            
+        if not os.path.isdir(self.input_file):
+            self.show_plan(config, self.input_file, os.path.getsize(self.input_file))
+            return
+        # 大目录统计大小需要较长时间，放到后台线程，结果交回界面线程显示
+        input_file = self.input_file
+        self.log_text.delete(1.0, tk.END)
+        self.log("🔍 正在统计目录大小...")
+        
+        def measure() -> None:
+            try:
+                total_size = SplitEngine.directory_size(input_file)
+            except OSError as e:
+                error = str(e)
+                self.parent.after(0, lambda: self.log(f"❌ 统计目录大小失败: {error}", error=True))
+                return
+            self.parent.after(0, lambda: self.show_plan(config, input_file, total_size))
             
-            filename = Path(self.input_file).name
-            chunk_name = f"{filename}.part({chunk_num}){config.custom_suffix}"
-            output_path = Path(self.output_dir) / chunk_name
+        thread = threading.Thread(target=measure)
+        thread.daemon = True
+        thread.start()
+        
+    def show_plan(self, config: CompressionConfig, input_file: str, total_size: int) -> None:
+        plan = VolumePlan.from_config(config, total_size)
+        
+        self.log_text.delete(1.0, tk.END)
+        self.log(f"🔍 预览: 共 {plan.part_count} 个分卷，总大小 {total_size / (1024 * 1024):.2f}MB")
+        if os.path.isdir(input_file):
+            self.log("ℹ️ 目录按文件内容估算，实际 tar 流会略大")
+        if config.codec:
+            self.log("ℹ️ 启用压缩后实际分卷数会随压缩率减少")
             
-            with open(output_path, 'wb') as chunk_file:
-                chunk_file.write(data)
-                
-            size_mb = size / (1024 * 1024)
-            self.log(f"📦 已生成: {chunk_name} ({size_mb:.2f}MB)")
-        except Exception as e:
-            self.log(f"❌ 写入分卷 {chunk_num} 时出错: {str(e)}", error=True)
-            raise
+        count = plan.part_count
+        if count <= 7:
+            shown = list(range(1, count + 1))
+        else:
+            shown = [1, 2, 3, 4, 5, count - 1, count]
+        previous = 0
+        for index in shown:
+            if index - previous > 1:
+                self.log("  ...")
+            offset, size = plan.part_range(index)
+            self.log(f"  part({index}): {size / (1024 * 1024):.2f}MB @ {offset}")
+            previous = index
         
     def start_processing(self) -> None:
         if self.is_processing:
@@ -1451,6 +3911,8 @@ class LanzouCompressor:
                  width=8).pack(side='left')
 
 class LanzouDecompressor:
+    MAX_LISTED_FILES = 500
+
     def __init__(self, parent) -> None:
         self.parent = parent
         self.initialize_variables()
@@ -1463,6 +3925,11 @@ class LanzouDecompressor:
         self.output_dir: str = str(Path.home() / "Desktop")
         self.is_processing: bool = False
         self.stop_flag: bool = False
+        self.workers_var = tk.StringVar(value="1")
+        self.group_workers_var = tk.StringVar(value="1")
+        self.merge_worker_count: int = 1
+        self.group_worker_count: int = 1
+        self.in_place_var = tk.BooleanVar(value=False)
         self.progress_var = tk.DoubleVar(value=0)
         self.output_path_var = tk.StringVar(value=self.output_dir)
         
@@ -1543,6 +4010,26 @@ class LanzouDecompressor:
         button_frame = ttk.Frame(control_frame)
         button_frame.pack(fill='x', pady=5, padx=5)
         
+        ttk.Label(button_frame,
+                 text="并行线程:",
+                 style='Custom.TLabel').pack(side='left', padx=(0, 5))
+        
+        ttk.Entry(button_frame,
+                 textvariable=self.workers_var,
+                 width=4).pack(side='left')
+        
+        ttk.Label(button_frame,
+                 text="同时合并组数:",
+                 style='Custom.TLabel').pack(side='left', padx=(15, 5))
+        
+        ttk.Entry(button_frame,
+                 textvariable=self.group_workers_var,
+                 width=4).pack(side='left')
+        
+        ttk.Checkbutton(button_frame,
+                       text="原地合并(节省空间)",
+                       variable=self.in_place_var).pack(side='left', padx=(15, 0))
+        
         ttk.Label(button_frame, style='Custom.TLabel').pack(side='left', fill='x', expand=True)
         
         start_button = ttk.Button(button_frame,
@@ -1551,6 +4038,12 @@ class LanzouDecompressor:
                                 command=self.start_processing)
         start_button.pack(side='left', padx=(0, 5))
         
+        watch_button = ttk.Button(button_frame,
+                                text="监视目录",
+                                style='Custom.TButton',
+                                command=self.start_watching)
+        watch_button.pack(side='left', padx=(0, 5))
+        
         stop_button = ttk.Button(button_frame,
                                text="停止合并",
                                style='Custom.TButton',
@@ -1599,20 +4092,7 @@ class LanzouDecompressor:
 
     def find_related_parts(self, first_file: str) -> list:
         try:
-            base_name = re.split(r'\.part\(\d+\)', Path(first_file).name)[0]
-            dir_path = Path(first_file).parent
-            
-            related_files = []
-            pattern = re.compile(rf'{re.escape(base_name)}\.part\((\d+)\).*')
-            
-            for file in dir_path.glob(f"{base_name}.part*"):
-                match = pattern.match(file.name)
-                if match:
-                    related_files.append((int(match.group(1)), str(file)))
-            
-            related_files.sort(key=lambda x: x[0])
-            return [f for _, f in related_files]
-            
+            return PartIndex.related_parts(first_file)
         except Exception as e:
             messagebox.showerror("错误", f"查找分卷文件时出错: {str(e)}")
             return []
@@ -1643,24 +4123,21 @@ class LanzouDecompressor:
             self.input_entry.delete(0, tk.END)
             self.input_entry.insert(0, dirname)
             
-            self.file_groups = {}
-            for file in Path(dirname).glob("*.part*"):
-                base_name = re.split(r'\.part\(\d+\)', file.name)[0]
-                if base_name not in self.file_groups:
-                    self.file_groups[base_name] = []
-                self.file_groups[base_name].append(str(file))
+            self.input_files = []
+            self.file_groups = PartIndex.scan(dirname)
             
             if self.file_groups:
-                for base_name in self.file_groups:
-                    self.file_groups[base_name].sort(key=lambda x: 
-                        int(re.search(r'\.part\((\d+)\)', Path(x).name).group(1)))
-                    
                 total_files = sum(len(files) for files in self.file_groups.values())
                 self.log(f"✅ 已找到 {len(self.file_groups)} 组分卷文件，共 {total_files} 个文件")
-                for base_name, files in self.file_groups.items():
-                    self.log(f"\n📁 {base_name}:")
-                    for f in files:
-                        self.log(f"  └─ {Path(f).name}")
+                # 文件很多时只列出每组的分卷数量，逐行写入日志框本身就会让界面卡顿
+                list_files = total_files <= self.MAX_LISTED_FILES
+                for (base_name, _), files in self.file_groups.items():
+                    if list_files:
+                        self.log(f"\n📁 {base_name}:")
+                        for f in files:
+                            self.log(f"  └─ {Path(f).name}")
+                    else:
+                        self.log(f"📁 {base_name}: {len(files)} 个分卷")
             else:
                 messagebox.showerror("错误", "所选目录中未找到分卷文件")
             
@@ -1682,11 +4159,33 @@ class LanzouDecompressor:
                                 "end-1c")
         self.log_text.see(tk.END)
         
+    def merge_workers(self) -> int:
+        return self.merge_worker_count
+        
+    def read_workers(self) -> bool:
+        """在界面线程读取并行设置，无效时报错而不是悄悄换成默认值"""
+        try:
+            workers = int(self.workers_var.get())
+            group_workers = int(self.group_workers_var.get())
+            if workers <= 0:
+                raise ValueError("并行线程数必须大于0")
+            if group_workers <= 0:
+                raise ValueError("同时合并组数必须大于0")
+        except ValueError as e:
+            messagebox.showerror("错误", f"无效的输入值: {str(e)}")
+            return False
+        self.merge_worker_count = workers
+        self.group_worker_count = group_workers
+        return True
+        
+    def group_workers(self) -> int:
+        return self.group_worker_count
+        
     def validate_inputs(self) -> bool:
         if hasattr(self, 'input_files') and self.input_files:
-            return True
+            return self.read_workers()
         if hasattr(self, 'file_groups') and self.file_groups:
-            return True
+            return self.read_workers()
         
         messagebox.showerror("错误", "请选择分卷文件或包含分卷文件的目录")
         return False
@@ -1694,7 +4193,7 @@ class LanzouDecompressor:
     def process_files(self) -> None:
         try:
             if hasattr(self, 'input_files') and self.input_files:
-                file_groups = {'single': self.input_files}
+                file_groups = {PartIndex.group_key(self.input_files[0]): self.input_files}
             elif hasattr(self, 'file_groups') and self.file_groups:
                 file_groups = self.file_groups
             else:
@@ -1702,46 +4201,77 @@ class LanzouDecompressor:
                 messagebox.showerror("错误", "未找到分卷文件")
                 return
             
-            total_groups = len(file_groups)
-            processed_groups = 0
+            # 进度按字节加权，多个分卷组同时合并时也能反映真实进度
+            total_bytes = sum(os.path.getsize(f) for files in file_groups.values() for f in files)
+            group_done = {}
+            progress_lock = threading.Lock()
+            throttle = DeviceThrottle()
+            failed_groups = []
             
-            for base_name, files in file_groups.items():
+            def merge_group(base_name: str, files: list) -> None:
                 if self.stop_flag:
-                    break
-                    
-                self.log(f"\n🔄 正在处理: {base_name}")
-                
+                    return
                 output_path = Path(self.output_dir) / base_name
                 
-                total_files = len(files)
-                processed_files = 0
+                def update_progress(done: int, total: int) -> None:
+                    with progress_lock:
+                        group_done[base_name] = done
+                        total_progress = (sum(group_done.values()) / total_bytes) * 100 if total_bytes else 100
+                    self.progress_var.set(total_progress)
+                    self.progress_label.config(text=f"{total_progress:.1f}%")
                 
-                with open(output_path, 'wb') as outfile:
-                    for file in files:
-                        if self.stop_flag:
-                            break
-                            
-                        with open(file, 'rb') as infile:
-                            outfile.write(infile.read())
-                            
-                        processed_files += 1
-                        group_progress = (processed_files / total_files)
-                        total_progress = ((processed_groups + group_progress) / total_groups) * 100
-                        
-                        self.progress_var.set(total_progress)
-                        self.progress_label.config(text=f"{total_progress:.1f}%")
-                        self.log(f"📦 已合并: {Path(file).name}")
+                with throttle.hold(files + [self.output_dir]):
+                    if self.stop_flag:
+                        return
+                    self.log(f"\n🔄 正在处理: {base_name}")
+                    engine = MergeEngine(files, output_path,
+                                         buffer_size=parse_size(APP_SETTINGS.buffer_size),
+                                         workers=self.merge_workers(),
+                                         log=self.log,
+                                         progress=update_progress,
+                                         should_stop=lambda: self.stop_flag,
+                                         in_place=self.in_place_var.get())
+                    try:
+                        stats = engine.run()
+                    except IntegrityError as e:
+                        # 校验失败只影响本组，其余分卷组继续合并
+                        self.log(f"❌ {e}", error=True)
+                        failed_groups.append(base_name)
+                        return
                         
-                if not self.stop_flag:
+                if stats['completed']:
                     self.log(f"✅ {base_name} 合并完成!")
-                    processed_groups += 1
+                elif stats['resumable']:
+                    self.log(f"⏸️ {base_name} 处理已停止，已合并的部分已保留，再次合并时从中断处继续", error=True)
                 else:
                     self.log(f"⚠️ {base_name} 处理已停止", error=True)
                     if output_path.exists():
                         output_path.unlink()
-                    break
+            
+            # 同名不同后缀的分卷组合并后输出文件同名，只合并第一组，避免互相覆盖
+            jobs = {}
+            for (base_name, suffix), files in file_groups.items():
+                if base_name in jobs:
+                    self.log(f"⚠️ {base_name}.part(*){suffix} 合并后与另一组分卷同名，已跳过，"
+                             f"请单独选择该组分卷合并", error=True)
+                    continue
+                jobs[base_name] = files
+                
+            with ThreadPoolExecutor(max_workers=self.group_workers()) as pool:
+                futures = [pool.submit(merge_group, base_name, files)
+                           for base_name, files in jobs.items()]
+                try:
+                    for future in futures:
+                        future.result()
+                except Exception:
+                    # 一组出错时让其余分卷组尽快停下，再把错误交给外层处理
+                    self.stop_flag = True
+                    raise
                         
-            if not self.stop_flag:
+            if failed_groups:
+                self.log(f"\n❌ 以下文件未通过完整性校验: {', '.join(failed_groups)}", error=True)
+                messagebox.showerror("校验失败", "以下文件未通过完整性校验:\n" + "\n".join(failed_groups))
+            elif not self.stop_flag:
                 self.log("\n✅ 所有文件合并完成!")
                 self.show_completion_dialog(
                     "所有文件合并已完成!",
@@ -1776,6 +4306,74 @@ class LanzouDecompressor:
         thread.daemon = True
         thread.start()
         
+    def start_watching(self) -> None:
+        """监视所选目录，每组分卷下载完成后自动合并到保存位置"""
+        if self.is_processing:
+            messagebox.showwarning("警告", "已有处理任务正在进行中")
+            return
+            
+        if not self.input_dir or not Path(self.input_dir).is_dir():
+            messagebox.showerror("错误", "请先选择要监视的分卷目录")
+            return
+        if not self.read_workers():
+            return
+            
+        self.is_processing = True
+        self.stop_flag = False
+        self.progress_var.set(0)
+        self.progress_label.config(text="0%")
+        self.log_text.delete(1.0, tk.END)
+        
+        thread = threading.Thread(target=self.watch_folder)
+        thread.daemon = True
+        thread.start()
+        
+    def watch_folder(self) -> None:
+        try:
+            FolderWatcher(self.input_dir,
+                          on_ready=self.merge_watched_group,
+                          log=self.log,
+                          should_stop=lambda: self.stop_flag).run()
+        except Exception as e:
+            self.log(f"❌ 错误: {str(e)}", error=True)
+            messagebox.showerror("错误", f"监视目录时出错: {str(e)}")
+        finally:
+            self.is_processing = False
+            self.progress_label.config(text="0%")
+            
+    def merge_watched_group(self, base_name: str, files: list) -> bool:
+        output_path = Path(self.output_dir) / base_name
+        
+        def update_progress(done: int, total: int) -> None:
+            progress = (done / total) * 100 if total else 100
+            self.progress_var.set(progress)
+            self.progress_label.config(text=f"{progress:.1f}%")
+            
+        engine = MergeEngine(files, output_path,
+                             buffer_size=parse_size(APP_SETTINGS.buffer_size),
+                             workers=self.merge_workers(),
+                             log=self.log,
+                             progress=update_progress,
+                             should_stop=lambda: self.stop_flag,
+                             in_place=self.in_place_var.get())
+        # 没有合并日志的已有输出说明之前已经合并完成
+        if output_path.exists() and not engine.journal_path().exists():
+            self.log(f"⏭️ {base_name} 已存在，跳过")
+            return True
+            
+        self.log(f"\n🔄 分卷已到齐，开始合并: {base_name}")
+        try:
+            stats = engine.run()
+        except IntegrityError as e:
+            self.log(f"❌ {e}", error=True)
+            return False
+            
+        if stats['completed']:
+            self.log(f"✅ {base_name} 合并完成!")
+            return True
+        self.log(f"⏸️ {base_name} 合并已停止", error=True)
+        return False
+        
     def stop_processing(self) -> None:
         if self.is_processing:
             self.stop_flag = True
@@ -1789,12 +4387,8 @@ class MediaSplitter:
         self.check_ffmpeg()
         
     def check_ffmpeg(self) -> None:
-        """检查是否安装了ffmpeg"""
-        try:
-            subprocess.run(['ffmpeg', '-version'], 
-                         stdout=subprocess.PIPE, 
-                         stderr=subprocess.PIPE)
-        except FileNotFoundError:
+        """检查是否安装了ffmpeg（结果在进程内缓存，切换工具时不再启动子进程）"""
+        if not all(media_tools().values()):
             messagebox.showerror("错误", 
                                "未检测到ffmpeg，请先安装ffmpeg并确保其在系统PATH中。\n"
                                "您可以从 https://ffmpeg.org/download.html 下载安装。")
@@ -1810,6 +4404,9 @@ class MediaSplitter:
         self.step_reduction_var = tk.StringVar(value="10.24")
         self.size_unit = tk.StringVar(value="MB")
         self.file_type = tk.StringVar(value="mp4")
+        self.extract_mode = tk.StringVar(value="单次读取")
+        self.io_bound_var = tk.BooleanVar(value=False)
+        self.media_workers_var = tk.StringVar(value=str(default_media_workers(False)))
         self.progress_var = tk.DoubleVar(value=0)
         self.output_path_var = tk.StringVar(value=self.output_dir)
         
@@ -1928,6 +4525,33 @@ class MediaSplitter:
                  text="KB",
                  style='Custom.TLabel').pack(side='left')
         
+        # 视频分段方式：单次读取由 segment 复用器一次切完；并行提取每段单独运行一个 ffmpeg
+        mode_frame = ttk.Frame(settings_frame)
+        mode_frame.pack(fill='x', pady=(0, 5), padx=5)
+        
+        ttk.Label(mode_frame,
+                 text="分段方式:",
+                 style='Custom.TLabel').pack(side='left', padx=(0, 5))
+        
+        ttk.Combobox(mode_frame,
+                    textvariable=self.extract_mode,
+                    values=["单次读取", "并行提取"],
+                    state="readonly",
+                    width=8).pack(side='left', padx=(0, 10))
+        
+        ttk.Label(mode_frame,
+                 text="并行进程:",
+                 style='Custom.TLabel').pack(side='left', padx=(0, 5))
+        
+        ttk.Entry(mode_frame,
+                 textvariable=self.media_workers_var,
+                 width=4).pack(side='left', padx=(0, 10))
+        
+        ttk.Checkbutton(mode_frame,
+                       text="I/O 密集",
+                       variable=self.io_bound_var,
+                       command=self.update_media_workers).pack(side='left')
+        
         # Right side - Control Buttons
         right_frame = ttk.Frame(controls_frame)
         right_frame.pack(side='right')
@@ -1997,129 +4621,190 @@ class MediaSplitter:
             if step_reduction <= 0:
                 raise ValueError("递减步长必须大于0")
                 
+            workers = int(self.media_workers_var.get())
+            if workers <= 0:
+                raise ValueError("并行进程数必须大于0")
+                
             return SplitConfig(
                 initial_size=initial_size,
                 step_reduction=step_reduction,
                 size_unit=self.size_unit.get(),
-                file_type=self.file_type.get()
+                file_type=self.file_type.get(),
+                buffer_size=parse_size(APP_SETTINGS.buffer_size),
+                media_workers=workers,
+                parallel_extract=self.extract_mode.get() == "并行提取",
+                io_bound=self.io_bound_var.get()
             )
         except ValueError as e:
             messagebox.showerror("错误", f"无效的输入值: {str(e)}")
             return None
 
+    def update_media_workers(self) -> None:
+        """切换 I/O 密集选项时把并行进程数改为对应的默认值"""
+        self.media_workers_var.set(str(default_media_workers(self.io_bound_var.get())))
+
     def get_video_duration(self, file_path: str) -> float:
-        """获取视频时长（秒）"""
-        cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration',
-               '-of', 'default=noprint_wrappers=1:nokey=1', file_path]
-        result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        return float(result.stdout)
-
-    def split_video(self, input_file: str, output_pattern: str, 
-                   start_time: float, duration: float) -> None:
-        """使用ffmpeg分割视频"""
+        """获取视频时长（秒），同一文件未修改时直接读缓存"""
+        return probe_media(file_path)['duration']
+
+    def segment_video(self, input_file: str, output_dir: str, file_type: str,
+                      segment_times: list, total_duration: float) -> list:
+        """用 ffmpeg 的 segment 复用器一次读完输入，在给定时间点（之后的关键帧）切出全部分段
+
+        输出文件名沿用 “文件名.part(N).扩展名” 的约定，返回按序号排列的输出文件。
+        """
+        filename = Path(input_file).name
+        # segment 复用器把整个输出路径当作 printf 格式，目录和文件名中的 % 都需要转义
+        prefix = str(Path(output_dir) / filename).replace('%', '%%')
+        pattern = f"{prefix}.part(%d).{file_type}"
         cmd = [
-            'ffmpeg', '-i', input_file,
-            '-ss', str(start_time),
-            '-t', str(duration),
+            media_tool('ffmpeg'), '-hide_banner', '-nostdin', '-y',
+            '-loglevel', 'error',
+            '-i', input_file,
+            '-map', '0',
             '-c', 'copy',
-            '-avoid_negative_ts', '1',
-            output_pattern
+            '-f', 'segment',
+            '-segment_format', file_type,
+            '-segment_start_number', '1',
+            '-reset_timestamps', '1',
+            '-progress', 'pipe:1', '-nostats',
         ]
-        subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        if segment_times:
+            cmd += ['-segment_times', ','.join(f"{t:.6f}" for t in segment_times)]
+        cmd.append(pattern)
+        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                   text=True, encoding='utf-8', errors='replace')
+        errors = deque(maxlen=20)
+        try:
+            for line in process.stdout:
+                if self.stop_flag:
+                    process.terminate()
+                    break
+                key, sep, value = line.strip().partition('=')
+                # out_time_us 和 out_time_ms 的单位实际上都是微秒
+                if key in ('out_time_us', 'out_time_ms') and value.isdigit():
+                    self.update_progress(int(value) / 1_000_000, total_duration)
+                elif not sep and key:
+                    errors.append(key)
+        finally:
+            process.wait()
+        if process.returncode != 0 and not self.stop_flag:
+            raise RuntimeError("ffmpeg 分段失败: " + " ".join(errors))
+            
+        outputs = []
+        for index in range(1, len(segment_times) + 2):
+            output_file = Path(output_dir) / f"{filename}.part({index}).{file_type}"
+            if output_file.exists():
+                outputs.append(output_file)
+        return outputs
 
+    def extract_segments(self, input_file: str, output_dir: str, file_type: str,
+                         cuts: list, workers: int,
+                         codec_args: tuple = ('-c', 'copy')) -> list:
+        """每个分段单独运行一个 ffmpeg，最多 workers 个同时运行，返回按序号排列的输出文件
+
+        -ss 放在 -i 之前，由输入端直接定位到分段起点的关键帧，每个任务只读取自己的那一段。
+        适合重新编码（codec_args）或自定义切点等需要逐段处理的场合。
+        """
+        filename = Path(input_file).name
+        ffmpeg = media_tool('ffmpeg')
+        bounds = [0.0] + list(cuts) + [None]
+        running = set()
+        closed = threading.Event()
+        lock = threading.Lock()
+        
+        def job(index: int) -> Optional[Path]:
+            if self.stop_flag:
+                return None
+            start, end = bounds[index - 1], bounds[index]
+            output_file = Path(output_dir) / f"{filename}.part({index}).{file_type}"
+            # 切点是关键帧时间，稍往后定位，保证落在该关键帧而不是前一个
+            seek = start + MediaCutPlanner.CUT_EPSILON if index > 1 else 0.0
+            cmd = [ffmpeg, '-hide_banner', '-nostdin', '-y', '-loglevel', 'error',
+                   '-ss', f"{seek:.6f}", '-i', input_file]
+            if end is not None:
+                cmd += ['-t', f"{end - start:.6f}"]
+            cmd += ['-map', '0', *codec_args, '-avoid_negative_ts', 'make_zero', str(output_file)]
+            # 在同一把锁内检查停止并登记进程，结束时的清理不会漏掉刚启动的 ffmpeg
+            with lock:
+                if closed.is_set() or self.stop_flag:
+                    return None
+                process = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+                                           text=True, encoding='utf-8', errors='replace')
+                running.add(process)
+            _, stderr = process.communicate()
+            with lock:
+                running.discard(process)
+            if process.returncode != 0:
+                if self.stop_flag:
+                    return None
+                raise RuntimeError(f"ffmpeg 提取 part({index}) 失败: {stderr.strip()[-500:]}")
+            return output_file
+            
+        outputs = {}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(job, index): index for index in range(1, len(bounds))}
+            pending = set(futures)
+            try:
+                while pending:
+                    done, pending = wait(pending, timeout=0.5, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        output_file = future.result()
+                        if output_file is not None:
+                            outputs[futures[future]] = output_file
+                            self.update_progress(len(outputs), len(futures))
+                    if self.stop_flag:
+                        break
+            finally:
+                # 停止或出错时结束仍在运行的 ffmpeg，未开始的任务直接取消
+                for future in futures:
+                    future.cancel()
+                with lock:
+                    closed.set()
+                    for process in running:
+                        process.terminate()
+        return [outputs[index] for index in sorted(outputs)]
+        
     def process_file(self, config: SplitConfig) -> None:
         try:
             if config.file_type == "mp4":
                 # 获取视频总时长
                 total_duration = self.get_video_duration(self.input_file)
                 
-                # 计算每个分段的时长（秒）
-                if config.size_unit == "GB":
-                    target_size = config.initial_size * 1024
-                elif config.size_unit == "MB":
-                    target_size = config.initial_size
-                else:  # KB
-                    target_size = config.initial_size / 1024
-                
-                # 估算比特率（bits/second）
-                filesize = os.path.getsize(self.input_file)
-                bitrate = (filesize * 8) / total_duration
+                # 读取数据包大小和关键帧，按递减的分卷大小规划切点
+                self.log("🔍 正在分析数据包和关键帧...")
+                planner = MediaCutPlanner.load(self.input_file)
+                cuts = planner.plan_cuts(VolumePlan.from_config(config), log=self.log)
+                segment_times = planner.cut_times(cuts)
+                for index, size in enumerate(planner.segment_sizes(cuts), 1):
+                    self.log(f"  part({index}): 预计 {size / (1024 * 1024):.2f}MB")
                 
-                # 计算每个分段的时长
-                segment_duration = (target_size * 1024 * 1024 * 8) / bitrate
-                
-                # 计算需要分割的段数
-                num_segments = math.ceil(total_duration / segment_duration)
-                
-                current_time = 0
-                for i in range(num_segments):
-                    if self.stop_flag:
-                        break
-                        
-                    # 计算当前段的时长
-                    current_duration = min(segment_duration, total_duration - current_time)
-                    
-                    # 生成输出文件名
-                    filename = Path(self.input_file).name
-                    output_file = Path(self.output_dir) / f"{filename}.part({i+1}).{config.file_type}"
-                    
-                    # 分割视频
-                    self.split_video(self.input_file, str(output_file), 
-                                   current_time, current_duration)
-                    
-                    # 更新进度
-                    progress = ((i + 1) / num_segments) * 100
-                    self.progress_var.set(progress)
-                    self.progress_label.config(text=f"{progress:.1f}%")
-                    
-                    # 记录日志
+                if config.parallel_extract:
+                    workers = config.media_workers
+                    if config.io_bound and workers > 1 and is_rotational(self.input_file):
+                        # 机械硬盘上多个进程同时读取不同位置只会增加寻道
+                        workers = 1
+                        self.log("ℹ️ 输入文件在机械硬盘上，I/O 密集任务改为单进程")
+                    self.log(f"⚙️ 并行提取 {len(cuts) + 1} 个分段，{workers} 个进程")
+                    outputs = self.extract_segments(self.input_file, self.output_dir,
+                                                    config.file_type, cuts, workers)
+                else:
+                    # 一次 ffmpeg 调用顺序读完输入并切出全部分段
+                    outputs = self.segment_video(self.input_file, self.output_dir, config.file_type,
+                                                 segment_times, total_duration)
+                for output_file in outputs:
                     size_mb = os.path.getsize(output_file) / (1024 * 1024)
                     self.log(f"📦 已生成: {output_file.name} ({size_mb:.2f}MB)")
                     
-                    current_time += current_duration
-                    
-            else:  # mp3文件使用原来的二进制分割方法
-                if config.size_unit == "GB":
-                    unit_factor = 1024 * 1024 * 1024
-                elif config.size_unit == "MB":
-                    unit_factor = 1024 * 1024
-                else:  # KB
-                    unit_factor = 1024
-                    
-                initial_bytes = int(config.initial_size * unit_factor)
-                step_bytes = int(config.step_reduction * 1024)
-                
-                total_size = os.path.getsize(self.input_file)
-                chunk_num = 1
-                offset = 0
-                
-                with open(self.input_file, 'rb') as f:
-                    while offset < total_size and not self.stop_flag:
-                        current_size = max(
-                            initial_bytes - (chunk_num - 1) * step_bytes,
-                            1024 * 1024  # Minimum 1MB
-                        )
-                        current_size = min(current_size, total_size - offset)
-                        
-                        f.seek(offset)
-                        data = f.read(current_size)
-                        
-                        filename = Path(self.input_file).name
-                        output_file = Path(self.output_dir) / f"{filename}.part({chunk_num}).{config.file_type}"
-                        
-                        with open(output_file, 'wb') as chunk_file:
-                            chunk_file.write(data)
-                        
-                        offset += current_size
-                        chunk_num += 1
-                        
-                        # Update progress
-                        progress = (offset / total_size) * 100
-                        self.progress_var.set(progress)
-                        self.progress_label.config(text=f"{progress:.1f}%")
-                        
-                        size_mb = current_size / (1024 * 1024)
-                        self.log(f"📦 已生成: {output_file.name} ({size_mb:.2f}MB)")
+            else:  # mp3 按 MPEG 帧边界切分，不需要 ffmpeg
+                engine = Mp3SplitEngine.from_config(
+                    self.input_file, self.output_dir, config, f".{config.file_type}",
+                    log=self.log,
+                    progress=self.update_progress,
+                    should_stop=lambda: self.stop_flag
+                )
+                stats = engine.run()
+                self.log(f"📊 {format_memory(stats)}")
 
             if not self.stop_flag:
                 self.log("✅ 处理完成!")
@@ -2154,6 +4839,11 @@ class MediaSplitter:
         thread.daemon = True
         thread.start()
         
+    def update_progress(self, done: int, total: int) -> None:
+        progress = (done / total) * 100 if total else 100
+        self.progress_var.set(progress)
+        self.progress_label.config(text=f"{progress:.1f}%")
+        
     def stop_processing(self) -> None:
         if self.is_processing:
             self.stop_flag = True
@@ -2199,6 +4889,206 @@ class MediaSplitter:
                  text="KB",
                  style='Custom.TLabel').pack(side='left')
 
+class MultipartStream:
+    """流式 multipart/form-data 请求体
+
+    文件部分直接从文件对象按块读取，已知总长度，requests 会带 Content-Length 边读边发，
+    不会把整个分卷读入内存。
+    """
+    def __init__(self, fields: dict, file_field: str, filename: str, fileobj,
+                 file_size: int) -> None:
+        self.boundary = '----LanzouBoundary' + ''.join(random.choices(string.ascii_letters + string.digits, k=16))
+        head = []
+        for key, value in fields.items():
+            head.append(f'--{self.boundary}\r\n'
+                        f'Content-Disposition: form-data; name="{key}"\r\n\r\n'
+                        f'{value}\r\n')
+        head.append(f'--{self.boundary}\r\n'
+                    f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+                    f'Content-Type: application/octet-stream\r\n\r\n')
+        self.head = io.BytesIO(''.join(head).encode('utf-8'))
+        self.tail = io.BytesIO(f'\r\n--{self.boundary}--\r\n'.encode('utf-8'))
+        self.fileobj = fileobj
+        self.length = len(self.head.getvalue()) + file_size + len(self.tail.getvalue())
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/form-data; boundary={self.boundary}'
+
+    def __len__(self) -> int:
+        return self.length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.length
+        chunks = []
+        for source in (self.head, self.fileobj, self.tail):
+            # 文件对象可能返回不足 size 的数据，读到它结束为止再接上结尾，否则分卷内容会被截断
+            while size > 0:
+                data = source.read(size)
+                if not data:
+                    break
+                chunks.append(data)
+                size -= len(data)
+        return b''.join(chunks)
+
+
+class DownloadMerger:
+    """边下载边合并：多个分卷同时下载，按顺序直接写入合并结果，分卷不落盘
+
+    parts 为按序号排列的 (文件名, 文件 id)。当前写入的分卷边下边写；提前到达的后续分卷暂存在
+    内存中，暂存总量超过 buffer_bytes 时这些下载暂停，等前面的分卷写完再继续。
+    提供清单时按清单核对每个分卷的大小和哈希，没有清单时用 sizes（网盘列表中的大小）估算进度。
+    下载中断时用 Range 请求从断点继续。
+    """
+    HEAD_QUEUE_CHUNKS = 8
+    RETRIES = 3
+
+    def __init__(self, api: 'LanzouAPI', parts: list, output_path: str,
+                 workers: int = 3, buffer_bytes: int = 64 * 1024 * 1024,
+                 manifest: Optional[dict] = None, sizes: Optional[list] = None,
+                 log=None, progress=None, should_stop=None) -> None:
+        self.api = api
+        self.parts = list(parts)
+        self.output_path = Path(output_path)
+        self.workers = max(1, workers)
+        self.buffer_bytes = max(buffer_bytes, DEFAULT_COPY_BUFFER)
+        self.manifest = manifest
+        self.log = log or (lambda message, error=False: None)
+        self.progress = progress or (lambda done, total: None)
+        self.should_stop = should_stop or (lambda: False)
+        if manifest:
+            self.total_size = sum(record['size'] for record in manifest['parts'])
+        else:
+            self.total_size = sum(sizes or [])
+        self.cond = threading.Condition()
+        self.queues = [deque() for _ in self.parts]
+        self.finished = [False] * len(self.parts)
+        self.buffered = 0
+        self.head = 0
+        self.error = None
+        self.closed = False
+
+    def stopped(self) -> bool:
+        return self.closed or self.error is not None or self.should_stop()
+
+    def run(self) -> bool:
+        """执行下载合并，返回是否完成；分卷缺失或校验失败时抛出 IntegrityError"""
+        self.check_parts()
+        completed = False
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                # 按序号提交，正在写入的分卷总是已经在下载，不会因为缓冲区满而互相等待
+                futures = [pool.submit(self.download, index) for index in range(len(self.parts))]
+                try:
+                    self.write_all()
+                finally:
+                    # 写入结束（完成、停止或出错）后让仍在等待的下载线程退出
+                    with self.cond:
+                        self.closed = True
+                        self.cond.notify_all()
+                    for future in futures:
+                        future.cancel()
+            if self.error is not None:
+                raise self.error
+            completed = not self.should_stop()
+            return completed
+        finally:
+            # 没有分卷文件可以重新合并，未完成的输出没有保留价值
+            if not completed and self.output_path.exists():
+                self.output_path.unlink()
+
+    def check_parts(self) -> None:
+        if not self.parts:
+            raise IntegrityError("网盘中没有找到这组分卷")
+        indexes = []
+        for name, _ in self.parts:
+            match = PART_PATTERN.match(name)
+            indexes.append(int(match.group('index')) if match else 0)
+        if indexes != list(range(1, len(indexes) + 1)):
+            raise IntegrityError("分卷编号不连续，请确认所有分卷都已上传")
+        if self.manifest and len(self.manifest['parts']) != len(self.parts):
+            raise IntegrityError(f"清单记录了 {len(self.manifest['parts'])} 个分卷，"
+                                 f"网盘中有 {len(self.parts)} 个")
+        if self.manifest and self.manifest.get('codec'):
+            raise IntegrityError("压缩分卷需要先下载到本地再合并")
+
+    def download(self, index: int) -> None:
+        try:
+            self.fetch(index)
+        except Exception as e:
+            # 任何下载错误都要交给写入线程，否则它会一直等待这个分卷
+            with self.cond:
+                if self.error is None:
+                    self.error = e
+                self.cond.notify_all()
+
+    def fetch(self, index: int) -> None:
+        name, file_id = self.parts[index]
+        received = 0
+        attempt = 0
+        while True:
+            try:
+                for chunk in self.api.iter_download(file_id, start=received):
+                    with self.cond:
+                        # 当前写入的分卷只限制队列长度，后续分卷受暂存总量限制
+                        self.cond.wait_for(lambda: self.stopped() or (
+                            len(self.queues[index]) < self.HEAD_QUEUE_CHUNKS
+                            if index == self.head else self.buffered < self.buffer_bytes))
+                        if self.stopped():
+                            return
+                        self.queues[index].append(chunk)
+                        self.buffered += len(chunk)
+                        self.cond.notify_all()
+                    received += len(chunk)
+                break
+            except IOError as e:
+                attempt += 1
+                if attempt > self.RETRIES or self.stopped():
+                    raise IOError(f"{name} 下载失败: {e}") from e
+                self.log(f"⚠️ {name} 下载中断，从 {received} 字节处重试 ({attempt}/{self.RETRIES})", error=True)
+        with self.cond:
+            self.finished[index] = True
+            self.cond.notify_all()
+
+    def write_all(self) -> None:
+        done_bytes = 0
+        algorithm = self.manifest.get('algorithm', 'sha256') if self.manifest else None
+        with open(self.output_path, 'wb') as outfile:
+            for index, (name, _) in enumerate(self.parts):
+                part_hash = hashlib.new(algorithm) if algorithm else None
+                part_bytes = 0
+                while True:
+                    with self.cond:
+                        self.cond.wait_for(lambda: self.stopped() or self.queues[index]
+                                           or self.finished[index])
+                        if self.stopped():
+                            return
+                        if not self.queues[index]:
+                            break
+                        chunk = self.queues[index].popleft()
+                        self.buffered -= len(chunk)
+                        self.cond.notify_all()
+                    if not self.manifest and index == 0 and part_bytes == 0 and \
+                            chunk[:4] == BlockCodec.MAGIC:
+                        raise IntegrityError("压缩分卷需要先下载到本地再合并")
+                    outfile.write(chunk)
+                    if part_hash:
+                        part_hash.update(chunk)
+                    part_bytes += len(chunk)
+                    done_bytes += len(chunk)
+                    # 网盘列表中的大小是约数，进度不超过总量
+                    self.progress(min(done_bytes, self.total_size), self.total_size)
+                if self.manifest:
+                    record = self.manifest['parts'][index]
+                    if part_bytes != record['size'] or part_hash.hexdigest() != record.get(algorithm):
+                        raise IntegrityError(f"{name} 大小或哈希与清单不符")
+                self.log(f"📦 已下载并合并: {name}")
+                with self.cond:
+                    self.head = index + 1
+                    self.cond.notify_all()
+
+
 class LanzouAPI:
     def __init__(self):
         self.session = requests.Session()
@@ -2213,6 +5103,20 @@ class LanzouAPI:
         self.folder_id = -1
         self.api_base_url = 'http://localhost:3000/api'
         self.check_server_connection()
+
+    @classmethod
+    def from_session(cls, session) -> 'LanzouAPI':
+        """复用已登录的会话（例如 LanZouCloud 登录后的 requests.Session），不连接 Node.js 服务器
+
+        上传和下载直接请求蓝奏云网页接口，只需要会话中的登录 Cookie。
+        """
+        api = cls.__new__(cls)
+        api.session = session
+        api.cookies = {}
+        api.is_logged_in = True
+        api.folder_id = -1
+        api.api_base_url = 'http://localhost:3000/api'
+        return api
         
     def check_server_connection(self):
         """检查 Node.js 服务器是否正常运行"""
@@ -2305,6 +5209,60 @@ class LanzouAPI:
             print(f"获取文件列表失败: {str(e)}")
             return []
 
+    def upload_fileobj(self, filename: str, fileobj, size: int, folder_id: str = '-1') -> str:
+        """从文件对象流式上传（例如 SplitEngine.virtual_parts() 返回的 PartReader），返回文件 id"""
+        if not self.is_logged_in:
+            return ""
+
+        try:
+            body = MultipartStream({
+                'task': '1',
+                'vie': '2',
+                've': '2',
+                'id': 'WU_FILE_0',
+                'name': filename,
+                'folder_id_bb_n': folder_id
+            }, 'upload_file', filename, fileobj, size)
+            
+            response = self.session.post(
+                'https://pc.woozooo.com/fileup.php',
+                data=body,
+                headers={'Content-Type': body.content_type}
+            )
+            result = response.json()
+            
+            if result.get('zt') == 1:
+                return result['text'][0].get('id', '')
+            print(f"上传失败: {result.get('info')}")
+            return ""
+        except Exception as e:
+            print(f"上传文件失败: {str(e)}")
+            return ""
+
+    def upload_file(self, file_path: str, folder_id: str = '-1') -> dict:
+        """上传本地文件，返回 {'code': 1 成功 / 0 失败, 'message': 说明, 'id': 文件 id}"""
+        with open(file_path, 'rb') as f:
+            file_id = self.upload_fileobj(Path(file_path).name, f,
+                                          os.path.getsize(file_path), folder_id)
+        if file_id:
+            return {'code': 1, 'message': '', 'id': file_id}
+        return {'code': 0, 'message': '服务器未接受该文件，详见控制台输出', 'id': ''}
+
+    def upload_virtual_parts(self, engine: SplitEngine, folder_id: str = '-1',
+                             progress=None) -> list:
+        """不在本地生成分卷，按分卷计划直接从源文件上传每个分卷，返回各分卷的文件 id"""
+        file_ids = []
+        parts = engine.virtual_parts()
+        for index, (name, reader) in enumerate(parts, 1):
+            with reader:
+                file_id = self.upload_fileobj(name, reader, len(reader), folder_id)
+            if not file_id:
+                raise IOError(f"分卷 {name} 上传失败")
+            file_ids.append(file_id)
+            if progress:
+                progress(index, len(parts))
+        return file_ids
+
     def get_download_url(self, file_id: str) -> str:
         """获取文件下载链接"""
         if not self.is_logged_in:
@@ -2347,23 +5305,82 @@ class LanzouAPI:
             print(f"获取下载链接失败: {str(e)}")
             return ""
 
-    def download_file(self, file_id: str, save_path: str) -> bool:
-        """下载文件"""
+    def iter_download(self, file_id: str, start: int = 0,
+                      chunk_size: int = DEFAULT_COPY_BUFFER):
+        """按块返回文件内容；start > 0 时用 Range 请求从该位置继续，服务器不支持时跳过前面的数据"""
         download_url = self.get_download_url(file_id)
         if not download_url:
-            return False
+            raise IOError(f"无法获取文件 {file_id} 的下载链接")
+        headers = {'Range': f'bytes={start}-'} if start else None
+        with self.session.get(download_url, stream=True, headers=headers) as response:
+            response.raise_for_status()
+            skip = start if start and response.status_code != 206 else 0
+            for chunk in response.iter_content(chunk_size=chunk_size):
+                if skip:
+                    if len(chunk) <= skip:
+                        skip -= len(chunk)
+                        continue
+                    chunk, skip = chunk[skip:], 0
+                if chunk:
+                    yield chunk
 
+    def download_file(self, file_id: str, save_path: str) -> bool:
+        """下载文件"""
         try:
-            response = self.session.get(download_url, stream=True)
             with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
+                for chunk in self.iter_download(file_id):
+                    f.write(chunk)
             return True
         except Exception as e:
             print(f"下载文件失败: {str(e)}")
             return False
 
+    @staticmethod
+    def file_entry(info) -> dict:
+        """文件列表项统一为字典；LanZouCloud.get_file_list 返回 File 命名元组"""
+        if isinstance(info, dict):
+            return info
+        return {'name': info.name, 'id': info.id, 'size': getattr(info, 'size', ''),
+                'time': getattr(info, 'time', ''), 'downs': getattr(info, 'downs', 0)}
+
+    @staticmethod
+    def parse_listed_size(text) -> int:
+        """把文件列表中的大小（如 "12.5 M"、"300 K"）换算为字节数，无法识别时返回 0"""
+        match = re.match(r'^\s*([\d.]+)\s*([KMGT]?)', str(text).upper())
+        if not match:
+            return 0
+        factor = {'': 1, 'K': 1024, 'M': 1024 ** 2, 'G': 1024 ** 3, 'T': 1024 ** 4}[match.group(2)]
+        try:
+            return int(float(match.group(1)) * factor)
+        except ValueError:
+            return 0
+
+    def download_and_merge(self, files: list, base_name: str, suffix: str, output_path: str,
+                           workers: int = 3, log=None, progress=None, should_stop=None) -> bool:
+        """下载一组分卷并直接合并为 output_path，不在本地保存分卷
+
+        files 为 get_file_list 返回的文件信息，只使用名称为 base_name、后缀为 suffix 的分卷
+        和 “base_name.manifest.json” 清单，同一文件夹中的其他分卷组不受影响。
+        """
+        parts = []
+        manifest_id = None
+        for info in map(self.file_entry, files):
+            match = PART_PATTERN.match(info['name'])
+            if match:
+                if match.group('base') == base_name and match.group('suffix') == suffix:
+                    parts.append((int(match.group('index')), info['name'], info['id'],
+                                  self.parse_listed_size(info.get('size', ''))))
+            elif info['name'] == f"{base_name}.manifest.json":
+                manifest_id = info['id']
+        parts.sort()
+        manifest = None
+        if manifest_id:
+            manifest = json.loads(b''.join(self.iter_download(manifest_id)).decode('utf-8'))
+        return DownloadMerger(self, [(name, file_id) for _, name, file_id, _ in parts],
+                              output_path, workers=workers, manifest=manifest,
+                              sizes=[size for _, _, _, size in parts],
+                              log=log, progress=progress, should_stop=should_stop).run()
+
     def delete_file(self, file_id: str) -> bool:
         """删除文件"""
         if not self.is_logged_in:
@@ -2501,7 +5518,187 @@ class LanzouAPI:
             print(f"清空回收站失败: {str(e)}")
             return False
 
+def io_counters() -> Optional[dict]:
+    """读取 /proc/self/io 中的系统调用次数和读写字节数（仅 Linux）"""
+    try:
+        with open('/proc/self/io', 'r') as f:
+            return {key: int(value) for key, value in
+                    (line.split(':') for line in f if ':' in line)}
+    except OSError:
+        return None
+
+
+def generate_benchmark_input(path: str, size: int, kind: str) -> None:
+    """生成基准测试用的输入文件：random 为随机数据，compressible 为重复文本"""
+    block_size = 4 * 1024 * 1024
+    if kind == 'compressible':
+        line = b'lanzou benchmark line with repeating, highly compressible content 0123456789\n'
+        block = (line * (block_size // len(line) + 1))[:block_size]
+    with open(path, 'wb') as f:
+        remaining = size
+        while remaining > 0:
+            n = min(block_size, remaining)
+            f.write(os.urandom(n) if kind == 'random' else block[:n])
+            remaining -= n
+
+
+def generate_mp3_input(path: str, size: int, kind: str) -> None:
+    """生成 mp3 结构的输入：ID3v2 标签加 128kbps/44.1kHz 的 MPEG-1 Layer III 帧，帧内容按 kind 填充"""
+    header = b'\xff\xfb\x90\x64'
+    frame_size = 417
+    payload = frame_size - len(header)
+    frames_per_block = 10000
+    if kind == 'compressible':
+        line = b'lanzou benchmark line with repeating, highly compressible content 0123456789\n'
+        filler = (line * (payload // len(line) + 1))[:payload]
+    tag = b'ID3\x03\x00\x00\x00\x00\x00\x00'
+    with open(path, 'wb') as f:
+        f.write(tag)
+        remaining = size - len(tag)
+        while remaining >= frame_size:
+            count = min(frames_per_block, remaining // frame_size)
+            if kind == 'random':
+                data = os.urandom(payload * count)
+                block = b''.join(header + data[i * payload:(i + 1) * payload] for i in range(count))
+            else:
+                block = (header + filler) * count
+            f.write(block)
+            remaining -= len(block)
+        # 不足一帧的尾部按无法识别的数据处理
+        f.write(bytes(remaining))
+
+
+def measure(name: str, size: int, func) -> dict:
+    """运行一个测试项，记录耗时、吞吐、峰值内存和系统调用次数"""
+    before = io_counters()
+    start = time.perf_counter()
+    stats = func()
+    seconds = time.perf_counter() - start
+    after = io_counters()
+    result = {
+        'case': name,
+        'bytes': size,
+        'seconds': round(seconds, 4),
+        'mb_per_s': round(size / (1024 * 1024) / seconds, 2) if seconds else None,
+        'parts': stats.get('parts'),
+        'peak_rss': peak_memory_bytes(),
+        'syscalls': None,
+    }
+    if before and after:
+        result['syscalls'] = {
+            'read': after['syscr'] - before['syscr'],
+            'write': after['syscw'] - before['syscw'],
+            'read_bytes': after['read_bytes'] - before['read_bytes'],
+            'write_bytes': after['write_bytes'] - before['write_bytes'],
+        }
+    return result
+
+
+def run_benchmark(argv: list) -> int:
+    """无界面基准测试：python <本脚本> --benchmark [--sizes 100MB,1GB] ..."""
+    parser = argparse.ArgumentParser(prog=f"{Path(sys.argv[0]).name} --benchmark",
+                                     description='分卷 / 合并 / 音频分卷吞吐基准测试')
+    parser.add_argument('--sizes', default='100MB,1GB,10GB', help='输入大小，逗号分隔')
+    parser.add_argument('--kinds', default='random,compressible', help='数据类型: random, compressible')
+    parser.add_argument('--cases', default='split,merge,media_split', help='测试项，逗号分隔')
+    parser.add_argument('--part-size', default='99MB', help='初始分卷大小')
+    parser.add_argument('--step', type=float, default=10.24, help='递减步长 (KB)')
+    parser.add_argument('--buffer', default=APP_SETTINGS.buffer_size, help='缓冲区大小')
+    parser.add_argument('--workers', type=int, default=1, help='并行线程数')
+    parser.add_argument('--workdir', default=None, help='临时文件目录（默认系统临时目录）')
+    parser.add_argument('--output', default='-', help='JSON 结果输出路径，- 表示标准输出')
+    args = parser.parse_args(argv)
+
+    workdir = Path(tempfile.mkdtemp(prefix='lanzou-bench-', dir=args.workdir))
+    cases = args.cases.split(',')
+    results = []
+    try:
+        for kind in args.kinds.split(','):
+            for size_text in args.sizes.split(','):
+                size = parse_size(size_text)
+                source = workdir / f"bench-{kind}-{size_text}.bin"
+                generate_benchmark_input(str(source), size, kind)
+                parts_dir = workdir / 'parts'
+
+                def split(suffix: str) -> dict:
+                    shutil.rmtree(parts_dir, ignore_errors=True)
+                    parts_dir.mkdir()
+                    return SplitEngine(str(source), str(parts_dir),
+                                       initial_bytes=parse_size(args.part_size),
+                                       step_bytes=int(args.step * 1024),
+                                       suffix=suffix,
+                                       buffer_size=parse_size(args.buffer),
+                                       workers=args.workers).run()
+
+                media_source = workdir / f"bench-{kind}-{size_text}.mp3"
+
+                def media_split() -> dict:
+                    # 音视频工具的 mp3 路径：扫描帧边界再切分，并写出清单
+                    shutil.rmtree(parts_dir, ignore_errors=True)
+                    parts_dir.mkdir()
+                    return Mp3SplitEngine(str(media_source), str(parts_dir),
+                                          initial_bytes=parse_size(args.part_size),
+                                          step_bytes=int(args.step * 1024),
+                                          suffix='.mp3',
+                                          buffer_size=parse_size(args.buffer)).run()
+
+                def merge() -> dict:
+                    plan = VolumePlan(parse_size(args.part_size), int(args.step * 1024), size)
+                    files = [str(parts_dir / f"{source.name}.part({index}).zip")
+                             for index, _, _ in plan]
+                    stats = MergeEngine(files, str(workdir / 'merged.bin'),
+                                        buffer_size=parse_size(args.buffer),
+                                        workers=args.workers).run()
+                    (workdir / 'merged.bin').unlink()
+                    return stats
+
+                for case in cases:
+                    if case == 'split':
+                        result = measure(case, size, lambda: split('.zip'))
+                    elif case == 'merge':
+                        if not (parts_dir / f"{source.name}.part(1).zip").exists():
+                            split('.zip')
+                        result = measure(case, size, merge)
+                    elif case == 'media_split':
+                        if not media_source.exists():
+                            generate_mp3_input(str(media_source), size, kind)
+                        result = measure(case, size, media_split)
+                    else:
+                        raise SystemExit(f"未知的测试项: {case}")
+                    result.update({'kind': kind, 'size': size_text})
+                    results.append(result)
+                    print(f"{case:12} {kind:12} {size_text:>8} {result['mb_per_s']} MB/s",
+                          file=sys.stderr)
+
+                shutil.rmtree(parts_dir, ignore_errors=True)
+                source.unlink()
+                media_source.unlink(missing_ok=True)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    report = json.dumps({
+        'tool': 'lanzou-split-benchmark',
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'buffer_size': parse_size(args.buffer),
+        'workers': args.workers,
+        'results': results,
+    }, ensure_ascii=False, indent=2)
+    if args.output == '-':
+        print(report)
+    else:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(report)
+    return 0
+
+
 if __name__ == "__main__":
+    if '--benchmark' in sys.argv[1:]:
+        sys.exit(run_benchmark([arg for arg in sys.argv[1:] if arg != '--benchmark']))
+    missing = [name for name, module in (('tkinter', tk), ('requests', requests),
+                                         ('lanzou-api', LanZouCloud)) if module is None]
+    if missing:
+        sys.exit(f"缺少启动界面所需的库: {', '.join(missing)}")
     app = MainApplication()
     app.run()
     app.run()
\ No newline at end of file